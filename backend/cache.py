@@ -0,0 +1,106 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+from fastapi import Request, Response
+
+from db import DB_PATH
+from responses import dumps
+
+# Cached responses kept, least recently used evicted first
+CACHE_ENTRIES = 256
+
+
+class ResponseCache:
+    """
+    Serialized JSON responses keyed by path and query parameters, and other
+    values derived from the data, like search match counts.
+
+    The data only changes when an ingestion script or worker commits, so
+    entries stay valid until SQLite's `PRAGMA data_version` moves (checked on
+    a dedicated connection, which sees commits from every other connection
+    and process) or `invalidate` bumps the generation, e.g. after the DB file
+    was replaced.
+    """
+
+    def __init__(self, path: str = DB_PATH, max_entries: int = CACHE_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.generation = 0
+        self._entries: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+
+    def _bump(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+
+    def _sync(self) -> None:
+        if self._conn is None:
+            if not os.path.exists(self.path):
+                return
+            self._conn = sqlite3.connect(
+                f"file:{self.path}?mode=ro", uri=True, check_same_thread=False
+            )
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._data_version is not None and version != self._data_version:
+            self._bump()
+        self._data_version = version
+
+    def invalidate(self) -> int:
+        with self._lock:
+            self._bump()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+                self._data_version = None
+            return self.generation
+
+    def value(self, key: Any, build: Callable[[], Any]) -> Any:
+        """Value cached for `key`, built on a miss and kept until the data changes."""
+        with self._lock:
+            self._sync()
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            generation = self.generation
+
+        value = build()
+        with self._lock:
+            # Don't store a value built from data that changed meanwhile
+            if self.generation == generation:
+                self._entries[key] = value
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def get(self, key: Any, build: Callable[[], Any]) -> Tuple[str, bytes]:
+        """ETag and body of the response for `key`, built and cached on a miss."""
+
+        def serialize() -> Tuple[str, bytes]:
+            body = dumps(build())
+            return f'"{hashlib.sha1(body).hexdigest()}"', body
+
+        return self.value(key, serialize)
+
+    def respond(self, request: Request, build: Callable[[], Any]) -> Response:
+        key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+        etag, body = self.get(key, build)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,217 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterator, List, Optional
+
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+
+from db import DB_PATH
+from responses import dumps
+
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "host.docker.internal")
+CHAT_MODEL = os.environ.get("CHAT_MODEL", "llama3:8b-instruct-q8_0")
+
+# LLM generations running at once; more chats wait for a slot
+CHAT_CONCURRENCY = int(os.environ.get("CHAT_CONCURRENCY", "2"))
+
+# Seconds a chat waits for a slot before it is turned away
+CHAT_QUEUE_TIMEOUT = float(os.environ.get("CHAT_QUEUE_TIMEOUT", "30"))
+
+# Sessions kept, least recently used evicted first, and idle seconds before
+# a session expires
+MAX_SESSIONS = 1000
+SESSION_TTL = 3600
+
+# Question and answer pairs of history sent with each message
+MAX_HISTORY_TURNS = 20
+
+_DONE = object()
+
+
+class ChatUnavailable(Exception):
+    pass
+
+
+class ChatSession:
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.history: List[List[str]] = []
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+
+class ChatSessions:
+    """
+    Conversations by session id.
+
+    Only touched from the event loop, so no locking. Ids are minted here:
+    an unknown or expired id starts a new session under a new id, which the
+    client reads back from the response.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, ttl: float = SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+
+    def get(self, session_id: Optional[str]) -> ChatSession:
+        now = time.monotonic()
+        # Least recently used first, so the expired ones are at the front
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used < self.ttl:
+                break
+            self._sessions.popitem(last=False)
+
+        session = self._sessions.get(session_id) if session_id else None
+        if session is None:
+            session = ChatSession(uuid.uuid4().hex)
+            self._sessions[session.id] = session
+            if len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session.id)
+        session.last_used = now
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+
+def sse(event: str, data: dict) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+class ChatService:
+    """
+    RAG chat over the bible corpus, answered by rag_chatbot's pipeline.
+
+    The pipeline is built on first use from the text chunks and the vectors
+    of the chunk sidecar, which must be up to date. rag_chatbot must be
+    importable in the API's environment. Each chat runs on a fork of the
+    pipeline's engine, so sessions share the retriever and LLM but not their
+    history.
+    """
+
+    def __init__(self, path: str = DB_PATH, concurrency: int = CHAT_CONCURRENCY):
+        self.path = path
+        self.concurrency = concurrency
+        self._pipeline = None
+        self._lock = threading.Lock()
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def pipeline(self):
+        if self._pipeline is not None:
+            return self._pipeline
+        # Turn chats away while another request builds the pipeline, rather
+        # than parking a threadpool worker on the lock for each of them
+        if not self._lock.acquire(blocking=False):
+            raise ChatUnavailable("Chat is starting, retry shortly")
+        try:
+            if self._pipeline is None:
+                self._pipeline = self._build_pipeline()
+            return self._pipeline
+        finally:
+            self._lock.release()
+
+    def _build_pipeline(self):
+        try:
+            from rag_chatbot import LocalRAGPipeline
+            from rag_chatbot.corpus import load_corpus_nodes
+        except ImportError as e:
+            raise ChatUnavailable(f"Chat unavailable: {e}")
+        try:
+            nodes, embeddings, embed_model = load_corpus_nodes(self.path)
+        except sqlite3.Error as e:
+            raise ChatUnavailable(f"Corpus unavailable: {e}")
+        if nodes and embeddings is None:
+            # Embedding the corpus is an offline job, never done in a request
+            raise ChatUnavailable(
+                "Chunk vectors missing or stale, rebuild them with "
+                "python -m rag_chatbot.corpus"
+            )
+        try:
+            pipeline = LocalRAGPipeline(host=OLLAMA_HOST)
+            pipeline.set_model_name(CHAT_MODEL)
+            pipeline.store_corpus(
+                os.path.basename(self.path), nodes, embeddings, embed_model
+            )
+            pipeline.set_chat_mode()
+        except Exception as e:
+            raise ChatUnavailable(f"Chat unavailable: {e}")
+        return pipeline
+
+    async def _acquire_slot(self) -> bool:
+        # Created lazily: before Python 3.10 a semaphore binds to the event
+        # loop current at its creation
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), CHAT_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def stream(
+        self, request: Request, session: ChatSession, message: str
+    ) -> AsyncIterator[bytes]:
+        """
+        Server-sent events answering `message`: `token` events with the
+        deltas of the answer, then `done` with the sources, or `error`.
+
+        Everything is acquired inside the stream, as Starlette may drop a
+        response whose body never started. When the client disconnects the
+        generation is cancelled, and the exchange is only added to the
+        session history once the answer is complete.
+        """
+        if session.lock.locked():
+            yield sse("error", {"detail": "A message of this session is in progress"})
+            return
+        async with session.lock:
+            if not await self._acquire_slot():
+                yield sse("error", {"detail": "Too many chats in progress, retry later"})
+                return
+            cancel = threading.Event()
+            try:
+                response = await run_in_threadpool(
+                    self.pipeline().query,
+                    "chat",
+                    message,
+                    list(session.history),
+                    isolated=True,
+                    cancel_event=cancel,
+                )
+                tokens = response.response_gen
+                answer = []
+                while True:
+                    if await request.is_disconnected():
+                        return
+                    token = await run_in_threadpool(next, tokens, _DONE)
+                    if token is _DONE:
+                        break
+                    answer.append(token)
+                    yield sse("token", {"delta": token})
+            except Exception as e:
+                yield sse("error", {"detail": str(e)})
+                return
+            finally:
+                # Also reached when the response is cancelled on disconnect
+                cancel.set()
+                self._slots.release()
+
+            session.history.append([message, "".join(answer).strip()])
+            del session.history[:-MAX_HISTORY_TURNS]
+            sources = [
+                {"id": source.node.node_id, "score": source.score, **source.node.metadata}
+                for source in getattr(response, "source_nodes", None) or []
+            ]
+            yield sse("done", {"session_id": session.id, "sources": sources})
+
+
+chat_sessions = ChatSessions()
+chat_service = ChatService()
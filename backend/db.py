@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+DB_PATH = os.environ.get("BIBLE_DB_PATH", "/data/bible.db")
+
+# Read connection tuning
+MMAP_SIZE = 256 * 1024 * 1024  # bytes of the DB file mapped into memory
+CACHE_SIZE_KIB = 64 * 1024  # page cache per connection
+CACHED_STATEMENTS = 256  # prepared statements kept per connection
+
+# Keys per IN (...) list, well below SQLite's bound parameter limit
+BATCH_SIZE = 500
+
+
+def enable_wal(path: str = DB_PATH) -> bool:
+    """
+    Switch the database to WAL journaling.
+
+    The mode is stored in the database file, so every later connection
+    (including the Celery workers' SQLAlchemy engine) uses it, and readers
+    keep reading their snapshot while a writer commits.
+    """
+    if not os.path.exists(path):
+        return False
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+    finally:
+        conn.close()
+    return mode.lower() == "wal"
+
+
+def connect_readonly(
+    path: str = DB_PATH, check_same_thread: bool = True
+) -> sqlite3.Connection:
+    """
+    Tuned read-only connection.
+
+    Pass `check_same_thread=False` for a connection that is handed between
+    threads, like the one behind a streamed response.
+    """
+    conn = sqlite3.connect(
+        f"file:{path}?mode=ro",
+        uri=True,
+        cached_statements=CACHED_STATEMENTS,
+        check_same_thread=check_same_thread,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA query_only=ON")
+    return conn
+
+
+class ReadOnlyPool:
+    """
+    One long-lived read-only connection per thread.
+
+    FastAPI runs sync endpoints on a fixed thread pool, so each worker thread
+    opens its connection once and keeps it, along with its page cache, mmap
+    and prepared statement cache, for the life of the process.
+    """
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def connection(self) -> sqlite3.Connection:
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect_readonly(self.path)
+            self._local.conn = conn
+        return conn
+
+    def reset(self) -> None:
+        """Drop this thread's connection, e.g. after the DB file was replaced."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+pool = ReadOnlyPool()
+
+
+def get_db() -> sqlite3.Connection:
+    """Pooled read-only connection of the current thread; do not close it."""
+    return pool.connection()
+
+
+def load_related(
+    conn: sqlite3.Connection,
+    sql: str,
+    keys: Iterable[Any],
+    batch_size: int = BATCH_SIZE,
+) -> Dict[Any, List[sqlite3.Row]]:
+    """
+    Fetch the rows related to many keys in bulk, grouped by key.
+
+    `sql` contains a `{keys}` slot for the IN (...) placeholder list and
+    selects the key as its first column. Keys are sent in batches of
+    `batch_size`, so N keys cost ceil(N / batch_size) queries instead of N.
+    Every key gets an entry, empty if it has no related rows.
+    """
+    keys = list(dict.fromkeys(keys))
+    grouped: Dict[Any, List[sqlite3.Row]] = {key: [] for key in keys}
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start : start + batch_size]
+        placeholders = ",".join("?" * len(batch))
+        for row in conn.execute(sql.format(keys=placeholders), batch):
+            grouped[row[0]].append(row)
+    return grouped
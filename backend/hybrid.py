@@ -0,0 +1,166 @@
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from db import DB_PATH
+
+# Sidecar written offline by `python -m rag_chatbot.corpus --db <bible.db>`
+VECTORS_PATH = os.environ.get(
+    "BIBLE_VECTORS_PATH", os.path.splitext(DB_PATH)[0] + ".chunk_vectors"
+)
+
+# Rows scored per matmul, bounds the float32 temporary for float16 vectors
+SCORE_BLOCK_ROWS = 65536
+
+# Query embeddings kept, least recently used evicted first
+QUERY_CACHE_SIZE = 1024
+
+# Standard reciprocal rank fusion constant
+RRF_K = 60
+
+# Shortest term a trigram FTS index can match
+TRIGRAM_MIN_LENGTH = 3
+
+
+class VectorsUnavailable(Exception):
+    pass
+
+
+class ChunkVectors:
+    """
+    Memory-mapped chunk vectors of the sidecar.
+
+    The matrix is mapped, not read, so it costs page cache rather than heap
+    and is shared by every worker process. A rebuilt sidecar is picked up on
+    the next search.
+    """
+
+    def __init__(self, path: str = VECTORS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._snapshot: Optional[Tuple[str, np.ndarray, np.ndarray]] = None
+
+    def load(self) -> Tuple[str, np.ndarray, np.ndarray]:
+        """Embedding model name, row ids and (normalized) vector matrix."""
+        try:
+            mtime = os.stat(self.path + ".json").st_mtime
+        except FileNotFoundError:
+            raise VectorsUnavailable(
+                "No chunk vectors, build them with python -m rag_chatbot.corpus"
+            )
+        with self._lock:
+            if mtime != self._mtime:
+                with open(self.path + ".json") as f:
+                    meta = json.load(f)
+                matrix = np.load(self.path + ".npy", mmap_mode="r")
+                rowids = np.asarray(meta["rowids"], dtype=np.int64)
+                if len(rowids) != matrix.shape[0]:
+                    raise VectorsUnavailable("Chunk vectors are being rebuilt")
+                self._snapshot = (meta["embed_model"], rowids, matrix)
+                self._mtime = mtime
+            return self._snapshot
+
+    def search(self, vector: np.ndarray, top_k: int) -> List[int]:
+        """Row ids of the `top_k` chunks most similar to `vector`, best first."""
+        _, rowids, matrix = self.load()
+        if len(rowids) == 0:
+            return []
+        scores = np.empty(len(rowids), dtype=np.float32)
+        for start in range(0, len(rowids), SCORE_BLOCK_ROWS):
+            block = matrix[start : start + SCORE_BLOCK_ROWS].astype(
+                np.float32, copy=False
+            )
+            scores[start : start + len(block)] = block @ vector
+        top_k = min(top_k, len(scores))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return rowids[top].tolist()
+
+
+class QueryEmbedder:
+    """
+    Embeds queries with the model the chunk vectors were built with.
+
+    The model comes from rag_chatbot, so it must be importable (and its
+    dependencies installed) in the API's environment. Embeddings are cached
+    per query, as the same searches come back often.
+    """
+
+    def __init__(self, max_entries: int = QUERY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._models: Dict[str, object] = {}
+        self._cache: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _model(self, model_name: str):
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is None:
+                try:
+                    from rag_chatbot.core.embedding import LocalEmbedding
+                    from rag_chatbot.setting import RAGSettings
+                except ImportError as e:
+                    raise VectorsUnavailable(f"Query embedding unavailable: {e}")
+                setting = RAGSettings()
+                setting.ingestion.embed_llm = model_name
+                model = LocalEmbedding.set(setting, lazy=True)
+                self._models[model_name] = model
+            return model
+
+    def embed(self, model_name: str, query: str) -> np.ndarray:
+        key = (model_name, query)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        vector = np.asarray(
+            self._model(model_name).get_query_embedding(query), dtype=np.float32
+        )
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        with self._lock:
+            self._cache[key] = vector
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return vector
+
+
+def fts_query(text: str, min_length: int = 1) -> Optional[str]:
+    """
+    Free text as an FTS5 query matching any of its words.
+
+    Words shorter than `min_length` are dropped: with the trigram tokenizer
+    (see `fts_min_length`) they would never match anything.
+    """
+    words = [word for word in re.findall(r"\w+", text) if len(word) >= min_length]
+    if not words:
+        return None
+    return " OR ".join('"' + word + '"' for word in dict.fromkeys(words))
+
+
+def fts_min_length(create_sql: Optional[str]) -> int:
+    """Shortest word worth matching, from the FTS table's CREATE statement."""
+    if create_sql and "trigram" in create_sql:
+        return TRIGRAM_MIN_LENGTH
+    return 1
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[int]], k: int = RRF_K
+) -> List[Tuple[int, float]]:
+    """Ids of all rankings by descending sum of 1 / (k + rank), rank from 1."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+chunk_vectors = ChunkVectors()
+query_embedder = QueryEmbedder()
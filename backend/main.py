@@ -1,9 +1,52 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional, Any
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+from typing import List, Literal, Optional, Any
 import sqlite3
 import json
+from cache import response_cache
+from chat import ChatUnavailable, chat_service, chat_sessions
+from db import enable_wal, get_db, load_related
+from hybrid import (
+    VectorsUnavailable,
+    chunk_vectors,
+    fts_min_length,
+    fts_query,
+    query_embedder,
+    reciprocal_rank_fusion,
+)
+from queries import (
+    CHAPTER_SCENES_SQL,
+    CHAPTERS_SQL,
+    CHUNKS_BY_ROWID_SQL,
+    CHUNKS_COUNT_SQL,
+    CHUNKS_SQL,
+    ENTITIES_SQL,
+    ENTITY_AFTER_FILTER,
+    ENTITY_APPEARANCES_SQL,
+    ENTITY_CATEGORY_FILTER,
+    ENTITY_EXISTS_SQL,
+    ENTITY_SQL,
+    EXPORT_CHUNKS_SQL,
+    EXPORT_ENTITIES_SQL,
+    EXPORT_SCENES_SQL,
+    FTS_TABLE_SQL,
+    HYBRID_FTS_SQL,
+    SCENE_AFTER_FILTER,
+    SCENE_EXISTS_SQL,
+    SCENE_MENTIONS_SQL,
+    SCENES_SQL,
+    SEARCH_COUNT_CAPPED_SQL,
+    SEARCH_COUNT_SQL,
+    SEARCH_SQL,
+    SNIPPETS_AFTER_FILTER,
+    SNIPPETS_MATCH_FILTER,
+    SNIPPETS_SQL,
+    list_sql,
+)
+from responses import FastJSONResponse, stream_ndjson
 
 app = FastAPI(title="Movie Bible API")
 
@@ -14,27 +57,47 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Session-Id"],
 )
 
-DB_PATH = "/data/bible.db"
-
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+@app.on_event("startup")
+def setup_db():
+    # Readers use pooled read-only connections (see db.py); WAL lets them
+    # keep reading while the Celery workers write.
+    enable_wal()
 
 # --- Models ---
+# Fields other than the id are optional: `fields=` leaves the others out
 class Entity(BaseModel):
     id: str
-    name: str
-    category: str
+    name: Optional[str] = None
+    category: Optional[str] = None
     data: Optional[Any] = None
 
 class Scene(BaseModel):
     id: str
-    chapter_title: str
-    summary: str
-    sequence_index: int
+    chapter_title: Optional[str] = None
+    summary: Optional[str] = None
+    sequence_index: Optional[int] = None
+
+ENTITY_FIELDS = ["id", "name", "category", "data"]
+SCENE_FIELDS = ["id", "chapter_title", "summary", "sequence_index"]
+
+MAX_PAGE_SIZE = 1000
+
+def check_cursor(conn, sql: str, after: str) -> None:
+    if conn.execute(sql, (after,)).fetchone() is None:
+        raise HTTPException(status_code=400, detail="Unknown `after` id")
+
+def select_fields(fields: Optional[str], allowed: List[str]) -> List[str]:
+    """Columns for a comma separated `fields` parameter; the id is always included."""
+    if not fields:
+        return allowed
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return ["id"] + [f for f in allowed if f in selected and f != "id"]
 
 # --- Endpoints ---
 
@@ -42,27 +105,69 @@ class Scene(BaseModel):
 def read_root():
     return {"status": "Movie Bible API Online"}
 
+# List endpoints only change when ingestion writes to the DB, so their
+# serialized responses are cached (see cache.py) and served with an ETag.
+#
+# /entities and /scenes return everything unless paged: pass `limit`, then
+# the id of the last item received as `after` to get the next page (400 if
+# that item no longer exists). `fields` selects columns, e.g.
+# `fields=id,name,category` skips the entity data; the others are left out.
+
 @app.get("/entities", response_model=List[Entity])
-def get_entities():
+def get_entities(
+    request: Request,
+    category: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+):
+    columns = select_fields(fields, ENTITY_FIELDS)
+    return response_cache.respond(
+        request, lambda: load_entities(columns, category, after, limit)
+    )
+
+def load_entities(columns, category=None, after=None, limit=None):
+    filters, params = [], []
+    if category is not None:
+        filters.append(ENTITY_CATEGORY_FILTER)
+        params.append(category)
     conn = get_db()
-    rows = conn.execute("SELECT id, name, category, data FROM entities ORDER BY name").fetchall()
-    conn.close()
+    if after is not None:
+        check_cursor(conn, ENTITY_EXISTS_SQL, after)
+        filters.append(ENTITY_AFTER_FILTER)
+        params.append(after)
+    params.append(limit or -1)
+
+    rows = conn.execute(list_sql(ENTITIES_SQL, columns, filters), params).fetchall()
     
-    results = []
-    for row in rows:
-        results.append({
-            "id": row["id"],
-            "name": row["name"],
-            "category": row["category"],
-            "data": json.loads(row["data"]) if row["data"] else None
-        })
-    return results
+    return [entity_dict(row) for row in rows]
+
+def entity_dict(row):
+    entity = dict(row)
+    if "data" in entity:
+        entity["data"] = json.loads(row["data"]) if row["data"] else None
+    return entity
 
 @app.get("/scenes", response_model=List[Scene])
-def get_scenes():
+def get_scenes(
+    request: Request,
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+):
+    columns = select_fields(fields, SCENE_FIELDS)
+    return response_cache.respond(request, lambda: load_scenes(columns, after, limit))
+
+def load_scenes(columns, after=None, limit=None):
+    filters, params = [], []
     conn = get_db()
-    rows = conn.execute("SELECT * FROM scenes ORDER BY sequence_index").fetchall()
-    conn.close()
+    if after is not None:
+        check_cursor(conn, SCENE_EXISTS_SQL, after)
+        filters.append(SCENE_AFTER_FILTER)
+        params.append(after)
+    params.append(limit or -1)
+
+    rows = conn.execute(list_sql(SCENES_SQL, columns, filters), params).fetchall()
     return [dict(row) for row in rows]
 
 # --- Chapter / Timeline Endpoints ---
@@ -87,21 +192,12 @@ class SceneDetail(BaseModel):
     mentions: List[EntityRef]
 
 @app.get("/chapters", response_model=List[ChapterSummary])
-def get_chapters():
+def get_chapters(request: Request):
+    return response_cache.respond(request, load_chapters)
+
+def load_chapters():
     conn = get_db()
-    # Group by chapter title, order by the sequence of the first scene in that chapter
-    sql = """
-        SELECT 
-            chapter_title as title, 
-            COUNT(id) as scene_count, 
-            MIN(id) as first_scene_id,
-            MIN(sequence_index) as sort_order
-        FROM scenes 
-        GROUP BY chapter_title 
-        ORDER BY sort_order
-    """
-    rows = conn.execute(sql).fetchall()
-    conn.close()
+    rows = conn.execute(CHAPTERS_SQL).fetchall()
     return [{
         "title": row["title"],
         "scene_count": row["scene_count"],
@@ -113,34 +209,25 @@ def get_chapter_scenes(title: str):
     conn = get_db()
     
     # 1. Get Scenes
-    scenes_rows = conn.execute(
-        "SELECT * FROM scenes WHERE chapter_title = ? ORDER BY sequence_index", 
-        (title,)
-    ).fetchall()
+    scenes_rows = conn.execute(CHAPTER_SCENES_SQL, (title,)).fetchall()
     
     if not scenes_rows:
         raise HTTPException(status_code=404, detail="Chapter not found")
         
+    # 2. Get Mentions of all scenes at once (The "Connected Elements")
+    mentions_by_scene = load_related(
+        conn, SCENE_MENTIONS_SQL, [s_row["id"] for s_row in scenes_rows]
+    )
+    
     results = []
     for s_row in scenes_rows:
         scene_id = s_row["id"]
-        
-        # 2. Get Mentions for this scene (The "Connected Elements")
-        mentions_sql = """
-            SELECT 
-                e.id, e.name, e.category, m.role 
-            FROM scene_mentions m
-            JOIN entities e ON m.entity_id = e.id
-            WHERE m.scene_id = ?
-        """
-        m_rows = conn.execute(mentions_sql, (scene_id,)).fetchall()
-        
         mentions = [{
             "id": m["id"],
             "name": m["name"],
             "category": m["category"],
             "role": m["role"]
-        } for m in m_rows]
+        } for m in mentions_by_scene[scene_id]]
 
         results.append({
             "id": scene_id,
@@ -151,7 +238,6 @@ def get_chapter_scenes(title: str):
             "mentions": mentions
         })
     
-    conn.close()
     return results
 
 @app.get("/entities/{entity_id}")
@@ -159,9 +245,8 @@ def get_entity_details(entity_id: str):
     conn = get_db()
     
     # 1. Get Entity Info
-    row = conn.execute("SELECT * FROM entities WHERE id = ?", (entity_id,)).fetchone()
+    row = conn.execute(ENTITY_SQL, (entity_id,)).fetchone()
     if not row:
-        conn.close()
         raise HTTPException(status_code=404, detail="Entity not found")
     
     entity = {
@@ -172,16 +257,7 @@ def get_entity_details(entity_id: str):
     }
     
     # 2. Get Appearances (Scenes)
-    appearances_sql = """
-        SELECT 
-            s.id, s.chapter_title, s.sequence_index, s.summary, m.role, m.context
-        FROM scene_mentions m
-        JOIN scenes s ON m.scene_id = s.id
-        WHERE m.entity_id = ?
-        ORDER BY s.sequence_index
-    """
-    rows = conn.execute(appearances_sql, (entity_id,)).fetchall()
-    conn.close()
+    rows = load_related(conn, ENTITY_APPEARANCES_SQL, [entity_id])[entity_id]
     
     entity["appearances"] = [{
         "scene_id": r["id"],
@@ -208,6 +284,10 @@ class SearchResponse(BaseModel):
     total: int
     results: List[TextChunk]
 
+# /corpus/search and /corpus/search/snippets take FTS5 query syntax as is.
+# When the index uses the trigram tokenizer (ingest_corpus_db.py --tokenizer
+# trigram), terms shorter than 3 characters never match.
+
 @app.get("/corpus/search", response_model=SearchResponse)
 def search_corpus(q: Optional[str] = None, limit: int = 50, offset: int = 0):
     conn = get_db()
@@ -216,39 +296,225 @@ def search_corpus(q: Optional[str] = None, limit: int = 50, offset: int = 0):
         # FTS5 Match
         try:
             # Get Total
-            count_sql = """
-                SELECT COUNT(*) 
-                FROM text_chunks_fts 
-                WHERE text_chunks_fts MATCH ?
-            """
-            total = conn.execute(count_sql, (q,)).fetchone()[0]
+            total = match_count(conn, q)
             
             # Get Results
-            sql = """
-                SELECT t.* 
-                FROM text_chunks t
-                JOIN text_chunks_fts f ON t.rowid = f.rowid
-                WHERE text_chunks_fts MATCH ? 
-                ORDER BY f.rank
-                LIMIT ? OFFSET ?
-            """
-            rows = conn.execute(sql, (q, limit, offset)).fetchall()
+            rows = conn.execute(SEARCH_SQL, (q, limit, offset)).fetchall()
         except sqlite3.OperationalError:
-            conn.close()
             raise HTTPException(status_code=400, detail="Invalid search query syntax")
     else:
         # Get Total
-        total = conn.execute("SELECT COUNT(*) FROM text_chunks").fetchone()[0]
+        total = response_cache.value(
+            ("chunk_count",), lambda: conn.execute(CHUNKS_COUNT_SQL).fetchone()[0]
+        )
         
         # Get Results
-        sql = "SELECT * FROM text_chunks LIMIT ? OFFSET ?"
-        rows = conn.execute(sql, (limit, offset)).fetchall()
+        rows = conn.execute(CHUNKS_SQL, (limit, offset)).fetchall()
         
-    conn.close()
-    return {
+    return FastJSONResponse({
         "total": total,
         "results": [dict(r) for r in rows]
-    }
+    })
+
+def match_count(conn, q):
+    # Same for every page of a query, so counted once until the data changes
+    return response_cache.value(
+        ("search_count", q), lambda: conn.execute(SEARCH_COUNT_SQL, (q,)).fetchone()[0]
+    )
+
+# --- Snippet Search ---
+# Pages through matches by keyset instead of OFFSET: pass the `next_cursor`
+# of a page as `cursor` to get the next one. Results carry FTS5 snippets of
+# the content instead of the whole chunk.
+
+# Broad queries with `count=approx` stop counting here
+APPROX_COUNT_LIMIT = 1000
+
+class SearchHit(BaseModel):
+    id: str
+    source_file: str
+    chapter_title: str
+    scene_index: int
+    paragraph_index: int
+    snippet: str
+    location_name: str
+    primary_characters: str
+
+class SnippetSearchResponse(BaseModel):
+    total: Optional[int]
+    total_is_exact: bool
+    next_cursor: Optional[str]
+    results: List[SearchHit]
+
+def parse_cursor(cursor: str):
+    try:
+        rank, rowid = cursor.rsplit(":", 1)
+        return float(rank), int(rowid)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@app.get("/corpus/search/snippets", response_model=SnippetSearchResponse)
+def search_corpus_snippets(
+    request: Request,
+    q: str,
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    tokens: int = Query(16, ge=1, le=64),
+    count: Literal["exact", "approx", "none"] = "exact",
+):
+    after = parse_cursor(cursor) if cursor else None
+
+    def build():
+        conn = get_db()
+        filters, params = [SNIPPETS_MATCH_FILTER], [tokens, q]
+        if after is not None:
+            filters.append(SNIPPETS_AFTER_FILTER)
+            params += [after[0], after[0], after[1]]
+        params.append(limit)
+
+        total, total_is_exact = None, False
+        try:
+            rows = conn.execute(list_sql(SNIPPETS_SQL, [], filters), params).fetchall()
+            if count == "exact":
+                total, total_is_exact = match_count(conn, q), True
+            elif count == "approx":
+                total = conn.execute(
+                    SEARCH_COUNT_CAPPED_SQL, (q, APPROX_COUNT_LIMIT + 1)
+                ).fetchone()[0]
+                # Past the limit, report the limit as a lower bound
+                total_is_exact = total <= APPROX_COUNT_LIMIT
+                total = min(total, APPROX_COUNT_LIMIT)
+        except sqlite3.OperationalError:
+            raise HTTPException(status_code=400, detail="Invalid search query syntax")
+
+        next_cursor = None
+        if len(rows) == limit:
+            next_cursor = f"{rows[-1]['rank']!r}:{rows[-1]['rowid']}"
+        return {
+            "total": total,
+            "total_is_exact": total_is_exact,
+            "next_cursor": next_cursor,
+            "results": [{
+                "id": r["id"],
+                "source_file": r["source_file"],
+                "chapter_title": r["chapter_title"],
+                "scene_index": r["scene_index"],
+                "paragraph_index": r["paragraph_index"],
+                "snippet": r["snippet"],
+                "location_name": r["location_name"],
+                "primary_characters": r["primary_characters"]
+            } for r in rows]
+        }
+
+    return response_cache.respond(request, build)
+
+# --- Hybrid Search ---
+# Fuses the FTS5 ranking with vector similarity over chunk embeddings built
+# offline (see hybrid.py), by reciprocal rank fusion. `q` is free text.
+
+class HybridHit(TextChunk):
+    score: float
+    fts_rank: Optional[int]
+    vector_rank: Optional[int]
+
+class HybridSearchResponse(BaseModel):
+    results: List[HybridHit]
+
+@app.get("/corpus/hybrid_search", response_model=HybridSearchResponse)
+def hybrid_search(
+    q: str,
+    limit: int = Query(20, ge=1, le=100),
+    candidates: int = Query(100, ge=1, le=1000),
+):
+    conn = get_db()
+    row = response_cache.value(
+        ("fts_table",), lambda: conn.execute(FTS_TABLE_SQL).fetchone()
+    )
+    create_sql = row[0] if row else None
+    match = fts_query(q, fts_min_length(create_sql))
+    fts_ids = []
+    if match:
+        fts_ids = [r[0] for r in conn.execute(HYBRID_FTS_SQL, (match, candidates))]
+
+    try:
+        embed_model, _, _ = chunk_vectors.load()
+        vector_ids = chunk_vectors.search(
+            query_embedder.embed(embed_model, q), candidates
+        )
+    except VectorsUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    fused = reciprocal_rank_fusion([fts_ids, vector_ids])[:limit]
+    rows = load_related(conn, CHUNKS_BY_ROWID_SQL, [rowid for rowid, _ in fused])
+    fts_rank = {rowid: i for i, rowid in enumerate(fts_ids, start=1)}
+    vector_rank = {rowid: i for i, rowid in enumerate(vector_ids, start=1)}
+
+    results = []
+    for rowid, score in fused:
+        if not rows[rowid]:
+            # Chunk deleted since the vectors were built
+            continue
+        chunk = dict(rows[rowid][0])
+        del chunk["rowid"]
+        chunk.update({
+            "score": score,
+            "fts_rank": fts_rank.get(rowid),
+            "vector_rank": vector_rank.get(rowid)
+        })
+        results.append(chunk)
+    return FastJSONResponse({"results": results})
+
+# --- Bulk Export ---
+# Whole tables as NDJSON (one JSON object per line), streamed in batches.
+
+@app.get("/export/entities")
+def export_entities():
+    return stream_ndjson(EXPORT_ENTITIES_SQL, transform=entity_dict)
+
+@app.get("/export/scenes")
+def export_scenes():
+    return stream_ndjson(EXPORT_SCENES_SQL)
+
+@app.get("/export/text_chunks")
+def export_text_chunks():
+    return stream_ndjson(EXPORT_CHUNKS_SQL)
+
+@app.post("/cache/invalidate")
+def invalidate_cache():
+    # Commits are picked up automatically; this is for a replaced DB file
+    return {"generation": response_cache.invalidate()}
+
+# --- Chat ---
+# RAG chat over the corpus, streamed as server-sent events (see chat.py).
+
+class ChatRequest(BaseModel):
+    message: str = Field(..., min_length=1)
+    session_id: Optional[str] = None
+
+@app.post("/chat")
+async def chat(request: Request, body: ChatRequest):
+    try:
+        # Built on the first chat, which takes a while
+        await run_in_threadpool(chat_service.pipeline)
+    except ChatUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    session = chat_sessions.get(body.session_id)
+    return StreamingResponse(
+        chat_service.stream(request, session, body.message),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Session-Id": session.id,
+        },
+    )
+
+@app.delete("/chat/{session_id}")
+async def delete_chat_session(session_id: str):
+    if not chat_sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"deleted": session_id}
 
 # --- Job System Monitoring ---
 import redis
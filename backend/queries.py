@@ -0,0 +1,144 @@
+# SQL behind the API endpoints, kept in one place so the query plans can be
+# checked against the schema in tests (see tests/test_query_plans.py).
+
+from typing import List
+
+
+def list_sql(template: str, columns: List[str], filters: List[str]) -> str:
+    where = " WHERE " + " AND ".join(filters) if filters else ""
+    return template.format(columns=", ".join(columns), where=where)
+
+
+# Columns of a chunk served by the API (text_chunks also has bookkeeping columns)
+CHUNK_COLUMNS = [
+    "id",
+    "content",
+    "source_file",
+    "chapter_title",
+    "scene_index",
+    "paragraph_index",
+    "location_name",
+    "primary_characters",
+    "tags",
+]
+
+# List queries take their columns and WHERE clause from `list_sql`, and are
+# paged by keyset: `after` is the id of the last row of the previous page.
+ENTITIES_SQL = "SELECT {columns} FROM entities{where} ORDER BY name, id LIMIT ?"
+
+ENTITY_CATEGORY_FILTER = "category = ?"
+
+ENTITY_AFTER_FILTER = "(name, id) > (SELECT name, id FROM entities WHERE id = ?)"
+
+# The `after` row must exist, or the filter would silently match nothing
+ENTITY_EXISTS_SQL = "SELECT 1 FROM entities WHERE id = ?"
+
+ENTITY_SQL = "SELECT * FROM entities WHERE id = ?"
+
+SCENES_SQL = "SELECT {columns} FROM scenes{where} ORDER BY sequence_index, id LIMIT ?"
+
+SCENE_AFTER_FILTER = (
+    "(sequence_index, id) > (SELECT sequence_index, id FROM scenes WHERE id = ?)"
+)
+
+SCENE_EXISTS_SQL = "SELECT 1 FROM scenes WHERE id = ?"
+
+# Group by chapter title, order by the sequence of the first scene in that chapter
+CHAPTERS_SQL = """
+    SELECT
+        chapter_title as title,
+        COUNT(id) as scene_count,
+        MIN(id) as first_scene_id,
+        MIN(sequence_index) as sort_order
+    FROM scenes
+    GROUP BY chapter_title
+    ORDER BY sort_order
+"""
+
+CHAPTER_SCENES_SQL = "SELECT * FROM scenes WHERE chapter_title = ? ORDER BY sequence_index"
+
+SCENE_MENTIONS_SQL = """
+    SELECT
+        m.scene_id, e.id, e.name, e.category, m.role
+    FROM scene_mentions m
+    JOIN entities e ON m.entity_id = e.id
+    WHERE m.scene_id IN ({keys})
+"""
+
+ENTITY_APPEARANCES_SQL = """
+    SELECT
+        m.entity_id, s.id, s.chapter_title, s.sequence_index, s.summary, m.role, m.context
+    FROM scene_mentions m
+    JOIN scenes s ON m.scene_id = s.id
+    WHERE m.entity_id IN ({keys})
+    ORDER BY s.sequence_index
+"""
+
+SEARCH_COUNT_SQL = """
+    SELECT COUNT(*)
+    FROM text_chunks_fts
+    WHERE text_chunks_fts MATCH ?
+"""
+
+SEARCH_SQL = f"""
+    SELECT {", ".join("t." + c for c in CHUNK_COLUMNS)}
+    FROM text_chunks t
+    JOIN text_chunks_fts f ON t.rowid = f.rowid
+    WHERE text_chunks_fts MATCH ?
+    ORDER BY f.rank
+    LIMIT ? OFFSET ?
+"""
+
+# Counts matches up to a limit, cheap even for very broad queries
+SEARCH_COUNT_CAPPED_SQL = """
+    SELECT COUNT(*) FROM (
+        SELECT 1 FROM text_chunks_fts WHERE text_chunks_fts MATCH ? LIMIT ?
+    )
+"""
+
+# Matching chunks as snippets of their content, with the match highlighted in
+# the location and characters, paged by keyset on (rank, rowid)
+SNIPPETS_SQL = """
+    SELECT
+        f.rowid, f.rank, t.id, t.source_file, t.chapter_title, t.scene_index,
+        t.paragraph_index,
+        snippet(text_chunks_fts, 0, '<mark>', '</mark>', '…', ?) AS snippet,
+        highlight(text_chunks_fts, 1, '<mark>', '</mark>') AS location_name,
+        highlight(text_chunks_fts, 2, '<mark>', '</mark>') AS primary_characters
+    FROM text_chunks_fts f
+    JOIN text_chunks t ON t.rowid = f.rowid{where}
+    ORDER BY f.rank, f.rowid
+    LIMIT ?
+"""
+
+SNIPPETS_MATCH_FILTER = "text_chunks_fts MATCH ?"
+
+SNIPPETS_AFTER_FILTER = "(f.rank > ? OR (f.rank = ? AND f.rowid > ?))"
+
+# Configuration of the FTS table (ingest_corpus_db.py --tokenizer)
+FTS_TABLE_SQL = (
+    "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'text_chunks_fts'"
+)
+
+# Lexical side of the hybrid search, best first
+HYBRID_FTS_SQL = """
+    SELECT rowid FROM text_chunks_fts
+    WHERE text_chunks_fts MATCH ?
+    ORDER BY rank
+    LIMIT ?
+"""
+
+CHUNKS_BY_ROWID_SQL = (
+    f"SELECT rowid, {', '.join(CHUNK_COLUMNS)} FROM text_chunks WHERE rowid IN ({{keys}})"
+)
+
+CHUNKS_COUNT_SQL = "SELECT COUNT(*) FROM text_chunks"
+
+CHUNKS_SQL = f"SELECT {', '.join(CHUNK_COLUMNS)} FROM text_chunks LIMIT ? OFFSET ?"
+
+# Bulk exports, streamed row by row
+EXPORT_ENTITIES_SQL = "SELECT id, name, category, data FROM entities ORDER BY name, id"
+
+EXPORT_SCENES_SQL = "SELECT * FROM scenes ORDER BY sequence_index, id"
+
+EXPORT_CHUNKS_SQL = f"SELECT {', '.join(CHUNK_COLUMNS)} FROM text_chunks ORDER BY rowid"
@@ -0,0 +1,67 @@
+import json
+from typing import Any, Callable, Iterator, Optional, Sequence
+
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+
+from db import DB_PATH, connect_readonly
+
+try:
+    import orjson
+except ImportError:  # Optional speedup, the stdlib encoder is the fallback
+    orjson = None
+
+# Rows fetched and written per chunk of a streamed export
+EXPORT_BATCH_SIZE = 1000
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response serialized directly, without a pass through the response model.
+
+    For content built from DB rows that already match the declared model; the
+    model still documents the endpoint.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def stream_ndjson(
+    sql: str,
+    params: Sequence[Any] = (),
+    transform: Optional[Callable[[Any], Any]] = None,
+    path: str = DB_PATH,
+) -> StreamingResponse:
+    """
+    Stream the rows of a query as newline delimited JSON.
+
+    Rows are read and sent EXPORT_BATCH_SIZE at a time, so memory stays flat
+    whatever the size of the result. The response is produced across threads
+    of the pool, so it reads from its own connection rather than a pooled one.
+    """
+
+    def lines() -> Iterator[bytes]:
+        conn = connect_readonly(path, check_same_thread=False)
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                yield b"".join(
+                    dumps(transform(row) if transform else dict(row)) + b"\n"
+                    for row in rows
+                )
+        finally:
+            conn.close()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -9,7 +9,9 @@ import os
 # We need a dedicated DB engine for the worker to avoid import cycles with the main app if possible.
 # Ideally we import from backend.database, but for this test we'll create a fresh engine.
 DB_URL = os.environ.get("DATABASE_URL", "sqlite:////data/bible.db")
-engine = create_engine(DB_URL)
+# Wait for other writers instead of failing with "database is locked"; the
+# API reads through WAL snapshots and never holds the write lock.
+engine = create_engine(DB_URL, connect_args={"timeout": 30})
 
 @app.task(name="tasks.fast_crud_task", bind=True)
 def fast_crud_task(self, data: str):
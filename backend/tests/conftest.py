@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The API, the CLI and the corpus script each run from their own directory
+for path in ("backend", "cli", os.path.join("scripts", "junkyard")):
+    sys.path.insert(0, os.path.join(ROOT, path))
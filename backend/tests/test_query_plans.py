@@ -0,0 +1,166 @@
+import sqlite3
+
+import pytest
+
+import queries
+from ingest_corpus_db import init_db as init_corpus
+from setup_db import MIGRATIONS, migrate
+
+# Index each API query is expected to use. A query may only read a table
+# without an index if it is listed with None.
+EXPECTED_INDEXES = {
+    "ENTITIES_SQL": "idx_entities_name",
+    "ENTITY_CATEGORY_FILTER": "idx_entities_category",
+    "ENTITY_AFTER_FILTER": "idx_entities_name",
+    "ENTITY_SQL": "sqlite_autoindex_entities_1",
+    "ENTITY_EXISTS_SQL": "sqlite_autoindex_entities_1",
+    "SCENES_SQL": "idx_scenes_sequence",
+    "SCENE_AFTER_FILTER": "idx_scenes_sequence",
+    "SCENE_EXISTS_SQL": "sqlite_autoindex_scenes_1",
+    "CHAPTERS_SQL": "idx_scenes_chapter",
+    "CHAPTER_SCENES_SQL": "idx_scenes_chapter",
+    "SCENE_MENTIONS_SQL": "sqlite_autoindex_scene_mentions_1",
+    "ENTITY_APPEARANCES_SQL": "idx_scene_mentions_entity",
+    "SEARCH_COUNT_SQL": "VIRTUAL TABLE",
+    "SEARCH_SQL": "VIRTUAL TABLE",
+    "SEARCH_COUNT_CAPPED_SQL": "VIRTUAL TABLE",
+    "SNIPPETS_SQL": "VIRTUAL TABLE",
+    "SNIPPETS_MATCH_FILTER": "VIRTUAL TABLE",
+    "SNIPPETS_AFTER_FILTER": "VIRTUAL TABLE",
+    # Schema table, a handful of rows
+    "FTS_TABLE_SQL": None,
+    "HYBRID_FTS_SQL": "VIRTUAL TABLE",
+    "CHUNKS_BY_ROWID_SQL": "INTEGER PRIMARY KEY",
+    "CHUNKS_COUNT_SQL": "sqlite_autoindex_text_chunks_1",
+    # Unfiltered page of chunks, in storage order
+    "CHUNKS_SQL": None,
+    "EXPORT_ENTITIES_SQL": "idx_entities_name",
+    "EXPORT_SCENES_SQL": "idx_scenes_sequence",
+    # Whole table in storage order
+    "EXPORT_CHUNKS_SQL": None,
+}
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    init_corpus(conn)
+    yield conn
+    conn.close()
+
+
+# Filters are checked as part of the list query they narrow down, on top of
+# the filters that query always has
+FILTERED_QUERIES = {
+    "ENTITY_": ("ENTITIES_SQL", []),
+    "SCENE_": ("SCENES_SQL", []),
+    "SNIPPETS_": ("SNIPPETS_SQL", ["SNIPPETS_MATCH_FILTER"]),
+}
+
+
+def api_sql(name):
+    for prefix, (query, required) in FILTERED_QUERIES.items():
+        if name == query or (name.startswith(prefix) and name.endswith("_FILTER")):
+            filters = required + [name] if name.endswith("_FILTER") else required
+            return queries.list_sql(
+                getattr(queries, query),
+                ["*"],
+                [getattr(queries, f) for f in dict.fromkeys(filters)],
+            )
+    return getattr(queries, name).format(keys="?, ?")
+
+
+def query_plan(conn, sql):
+    params = [None] * sql.count("?")
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def test_every_query_is_checked():
+    names = {
+        name for name in dir(queries) if name.endswith(("_SQL", "_FILTER"))
+    }
+    assert names == set(EXPECTED_INDEXES)
+
+
+@pytest.mark.parametrize("name", sorted(EXPECTED_INDEXES))
+def test_query_uses_index(conn, name):
+    plan = query_plan(conn, api_sql(name))
+    index = EXPECTED_INDEXES[name]
+    if index is not None:
+        assert any(index in step for step in plan), plan
+    full_scans = [
+        step
+        for step in plan
+        if step.startswith("SCAN")
+        # Subquery results are scanned in memory
+        and not step.startswith("SCAN (")
+        and "INDEX" not in step
+        and "VIRTUAL TABLE" not in step
+    ]
+    assert not full_scans or index is None, plan
+
+
+def test_migrations_dedupe_mentions(tmp_path):
+    path = str(tmp_path / "bible.db")
+    conn = sqlite3.connect(path)
+    # A database created before the migration runner existed
+    for sql in MIGRATIONS[0]:
+        conn.execute(sql)
+    conn.executemany(
+        "INSERT INTO scene_mentions VALUES (?, ?, ?, ?)",
+        [
+            ("s1", "e1", "APPEARANCE", "old"),
+            ("s1", "e1", "APPEARANCE", "new"),
+            ("s1", "e1", "LOCATION", "Scene setting"),
+        ],
+    )
+    conn.commit()
+
+    migrate(conn)
+    migrate(conn)
+
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    rows = conn.execute(
+        "SELECT role, context FROM scene_mentions ORDER BY role"
+    ).fetchall()
+    assert rows == [("APPEARANCE", "new"), ("LOCATION", "Scene setting")]
+
+    conn.execute(
+        "INSERT OR REPLACE INTO scene_mentions VALUES ('s1', 'e1', 'APPEARANCE', 'again')"
+    )
+    assert conn.execute("SELECT COUNT(*) FROM scene_mentions").fetchone()[0] == 2
+
+    # A mention without a role gets the default one
+    conn.execute(
+        "INSERT OR REPLACE INTO scene_mentions VALUES ('s1', 'e2', NULL, 'no role')"
+    )
+    assert conn.execute(
+        "SELECT role FROM scene_mentions WHERE entity_id = 'e2'"
+    ).fetchone() == ("MENTION",)
+    conn.close()
+
+
+def test_keyset_pages_reach_null_sort_keys(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "bible.db"))
+    for sql in MIGRATIONS[0]:
+        conn.execute(sql)
+    conn.executemany(
+        "INSERT INTO entities (id, name) VALUES (?, ?)",
+        [("e1", "Alice"), ("e2", None), ("e3", "Bob")],
+    )
+    conn.commit()
+    migrate(conn)
+
+    page_sql = queries.list_sql(queries.ENTITIES_SQL, ["id"], [])
+    after_sql = queries.list_sql(
+        queries.ENTITIES_SQL, ["id"], [queries.ENTITY_AFTER_FILTER]
+    )
+    ids = [row[0] for row in conn.execute(page_sql, (1,))]
+    while True:
+        page = [row[0] for row in conn.execute(after_sql, (ids[-1], 1))]
+        if not page:
+            break
+        ids += page
+    assert ids == ["e2", "e1", "e3"]
+    conn.close()
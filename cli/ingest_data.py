@@ -3,6 +3,7 @@ import json
 import os
 import glob
 from typing import Dict, List
+from setup_db import migrate
 
 DB_PATH = "/data/bible.db"
 # Map volume paths
@@ -12,6 +13,8 @@ CHAPTER_ANALYSIS_DIR = "/data/passes/01_scene_summary"
 def get_db_connection():
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
+    # Bring older databases up to date before writing to them
+    migrate(conn)
     return conn
 
 def load_json(path):
@@ -6,22 +6,23 @@ from glob import glob
 DB_PATH = "/data/bible.db"
 JSON_DIR = "/data/json_out" # Mapped volume
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # 1. ENTITIES
-    c.execute('''
+# Schema migrations, applied in order. PRAGMA user_version holds the number
+# of migrations already applied, so only the new ones run on an existing DB.
+# Never edit a released migration, append a new one instead.
+MIGRATIONS = [
+    # 1. Base schema
+    [
+        # ENTITIES
+        '''
         CREATE TABLE IF NOT EXISTS entities (
             id TEXT PRIMARY KEY,
             name TEXT,
             category TEXT,
             data JSON
         )
-    ''')
-    
-    # 2. SCENES
-    c.execute('''
+        ''',
+        # SCENES
+        '''
         CREATE TABLE IF NOT EXISTS scenes (
             id TEXT PRIMARY KEY,
             chapter_title TEXT,
@@ -29,10 +30,9 @@ def init_db():
             summary TEXT,
             location_id TEXT
         )
-    ''')
-
-    # 3. SCENE_MENTIONS (The Graph)
-    c.execute('''
+        ''',
+        # SCENE_MENTIONS (The Graph)
+        '''
         CREATE TABLE IF NOT EXISTS scene_mentions (
             scene_id TEXT,
             entity_id TEXT,
@@ -41,11 +41,146 @@ def init_db():
             FOREIGN KEY(scene_id) REFERENCES scenes(id),
             FOREIGN KEY(entity_id) REFERENCES entities(id)
         )
-    ''')
-    
-    conn.commit()
+        ''',
+    ],
+    # 2. Mention primary key and lookup indexes
+    [
+        # A mention is unique per (scene, entity, role), so INSERT OR REPLACE
+        # updates it instead of appending a duplicate. Rebuild the table,
+        # keeping the last copy of already duplicated mentions.
+        '''
+        CREATE TABLE scene_mentions_new (
+            scene_id TEXT NOT NULL,
+            entity_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            context TEXT,
+            PRIMARY KEY(scene_id, entity_id, role),
+            FOREIGN KEY(scene_id) REFERENCES scenes(id),
+            FOREIGN KEY(entity_id) REFERENCES entities(id)
+        )
+        ''',
+        '''
+        INSERT OR REPLACE INTO scene_mentions_new (scene_id, entity_id, role, context)
+        SELECT scene_id, entity_id, role, context FROM scene_mentions
+        WHERE scene_id IS NOT NULL AND entity_id IS NOT NULL AND role IS NOT NULL
+        ORDER BY rowid
+        ''',
+        "DROP TABLE scene_mentions",
+        "ALTER TABLE scene_mentions_new RENAME TO scene_mentions",
+        # Mentions by scene are covered by the primary key; this one covers
+        # the appearances of an entity, context included
+        '''
+        CREATE INDEX IF NOT EXISTS idx_scene_mentions_entity
+        ON scene_mentions(entity_id, scene_id, role, context)
+        ''',
+        # Scenes of a chapter in order, and the per-chapter aggregates
+        '''
+        CREATE INDEX IF NOT EXISTS idx_scenes_chapter
+        ON scenes(chapter_title, sequence_index, id)
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_scenes_sequence ON scenes(sequence_index)",
+        "CREATE INDEX IF NOT EXISTS idx_entities_name ON entities(name)",
+    ],
+    # 3. Keyset pagination: list orders end on the id as a tiebreaker
+    [
+        "DROP INDEX IF EXISTS idx_entities_name",
+        "CREATE INDEX idx_entities_name ON entities(name, id)",
+        "CREATE INDEX idx_entities_category ON entities(category, name, id)",
+        "DROP INDEX IF EXISTS idx_scenes_sequence",
+        "CREATE INDEX idx_scenes_sequence ON scenes(sequence_index, id)",
+    ],
+    # 4. Mentions without a role: INSERT OR REPLACE stores the default role
+    # instead of failing the NOT NULL constraint (and the whole ingest)
+    [
+        '''
+        CREATE TABLE scene_mentions_new (
+            scene_id TEXT NOT NULL,
+            entity_id TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'MENTION',
+            context TEXT,
+            PRIMARY KEY(scene_id, entity_id, role),
+            FOREIGN KEY(scene_id) REFERENCES scenes(id),
+            FOREIGN KEY(entity_id) REFERENCES entities(id)
+        )
+        ''',
+        "INSERT INTO scene_mentions_new SELECT scene_id, entity_id, role, context FROM scene_mentions",
+        "DROP TABLE scene_mentions",
+        "ALTER TABLE scene_mentions_new RENAME TO scene_mentions",
+        '''
+        CREATE INDEX idx_scene_mentions_entity
+        ON scene_mentions(entity_id, scene_id, role, context)
+        ''',
+    ],
+    # 5. Keyset pagination: a NULL in the sort columns compares as NULL and
+    # would end the paging there, so they become NOT NULL (with a default
+    # for OR REPLACE, like the mention role)
+    [
+        '''
+        CREATE TABLE entities_new (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL DEFAULT '',
+            category TEXT,
+            data JSON
+        )
+        ''',
+        '''
+        INSERT INTO entities_new (id, name, category, data)
+        SELECT id, COALESCE(name, ''), category, data FROM entities
+        ''',
+        "DROP TABLE entities",
+        "ALTER TABLE entities_new RENAME TO entities",
+        "CREATE INDEX idx_entities_name ON entities(name, id)",
+        "CREATE INDEX idx_entities_category ON entities(category, name, id)",
+        '''
+        CREATE TABLE scenes_new (
+            id TEXT PRIMARY KEY,
+            chapter_title TEXT,
+            sequence_index INTEGER NOT NULL DEFAULT 0,
+            summary TEXT,
+            location_id TEXT
+        )
+        ''',
+        '''
+        INSERT INTO scenes_new (id, chapter_title, sequence_index, summary, location_id)
+        SELECT id, chapter_title, COALESCE(sequence_index, 0), summary, location_id
+        FROM scenes
+        ''',
+        "DROP TABLE scenes",
+        "ALTER TABLE scenes_new RENAME TO scenes",
+        '''
+        CREATE INDEX idx_scenes_chapter
+        ON scenes(chapter_title, sequence_index, id)
+        ''',
+        "CREATE INDEX idx_scenes_sequence ON scenes(sequence_index, id)",
+    ],
+]
+
+def migrate(conn):
+    """Apply the migrations not yet applied to `conn`, each in its own transaction."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # Manage transactions explicitly, DDL included
+    try:
+        for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql in statements:
+                    conn.execute(sql)
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            print(f"Applied migration {number}.")
+    finally:
+        conn.isolation_level = isolation_level
+    return len(MIGRATIONS)
+
+def init_db():
+    conn = sqlite3.connect(DB_PATH)
+    version = migrate(conn)
     conn.close()
-    print("Database initialized.")
+    print(f"Database initialized (schema version {version}).")
 
 if __name__ == "__main__":
     init_db()
@@ -1,7 +1,15 @@
-from .pipeline import LocalRAGPipeline
 from .ollama import run_ollama_server
 
 __all__ = [
     "LocalRAGPipeline",
     "run_ollama_server",
 ]
+
+
+def __getattr__(name):
+    # Defer importing llama_index and friends until the pipeline is needed
+    if name == "LocalRAGPipeline":
+        from .pipeline import LocalRAGPipeline
+
+        return LocalRAGPipeline
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
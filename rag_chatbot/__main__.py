@@ -1,15 +1,26 @@
-import argparse
-import llama_index
-from dotenv import load_dotenv
-from .ui import LocalChatbotUI
-from .pipeline import LocalRAGPipeline
-from .logger import Logger
-from .ollama import run_ollama_server, is_port_open
+import time
+
+START_TIME = time.perf_counter()
+
+import argparse  # noqa: E402
+import os  # noqa: E402
+import llama_index  # noqa: E402
+from dotenv import load_dotenv  # noqa: E402
+from .ui import LocalChatbotUI  # noqa: E402
+from .pipeline import LocalRAGPipeline  # noqa: E402
+from .logger import Logger  # noqa: E402
+from .ollama import run_ollama_server, is_port_open  # noqa: E402
+from .profiling import Profiler  # noqa: E402
+from .startup import StartupTimer  # noqa: E402
 
 load_dotenv()
+timer = StartupTimer(start=START_TIME)
+timer.mark("imports")
 
 # CONSTANTS
 LOG_FILE = "logging.log"
+TIMING_FILE = "startup_timing.jsonl"
+TRACE_FILE = "traces.jsonl"
 DATA_DIR = "data/data"
 AVATAR_IMAGES = ["./assets/user.png", "./assets/bot.png"]
 
@@ -37,7 +48,11 @@ logger = Logger(LOG_FILE)
 logger.reset_logs()
 
 # PIPELINE
-pipeline = LocalRAGPipeline(host=args.host)
+# Profiles are written next to the log file and summarized in the log view
+profiler = Profiler(output_dir=os.path.dirname(logger.filename), logger=logger)
+pipeline = LocalRAGPipeline(host=args.host, trace_file=TRACE_FILE, profiler=profiler)
+timer.mark("pipeline")
+warm_up = pipeline.warm_up(timer)
 
 # UI
 ui = LocalChatbotUI(
@@ -48,4 +63,20 @@ ui = LocalChatbotUI(
     avatar_images=AVATAR_IMAGES,
 )
 
-ui.build().launch(share=args.share, server_name="0.0.0.0", debug=False, show_api=False)
+demo = ui.build()
+timer.mark("ui_build")
+
+demo.launch(
+    share=args.share,
+    server_name="0.0.0.0",
+    debug=False,
+    show_api=False,
+    prevent_thread_lock=True,
+)
+timer.mark("ui_launch")
+print(timer.report())
+
+# Record the full cold start once the background warm-up has finished
+warm_up.join()
+timer.save(TIMING_FILE)
+demo.block_thread()
@@ -0,0 +1,8 @@
+from .synthetic import StubEmbedding, StubLLM, StubRerank, SyntheticCorpus
+
+__all__ = [
+    "StubEmbedding",
+    "StubLLM",
+    "StubRerank",
+    "SyntheticCorpus",
+]
@@ -0,0 +1,242 @@
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+from llama_index.core import Settings, VectorStoreIndex
+from llama_index.core.retrievers import VectorIndexRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from llama_index.retrievers.bm25 import BM25Retriever
+from ..core.engine import LocalRetriever, get_rerank_model
+from ..core.engine.retriever import FusionRetriever
+from ..core.prompt import get_query_gen_prompt
+from ..core.vector_store import NumpyVectorStore
+from ..setting import RAGSettings
+from .synthetic import StubEmbedding, StubLLM, StubRerank, SyntheticCorpus
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def latency_stats(latencies: list[float], wall_time: float) -> dict:
+    values = np.asarray(latencies) * 1000
+    return {
+        "count": len(values),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "throughput_qps": round(len(values) / wall_time, 2) if wall_time else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+class RetrievalBenchmark:
+    def __init__(
+        self,
+        num_chunks: int,
+        num_queries: int = 200,
+        dim: int = 384,
+        dtype: str = "float32",
+        rerank: str = "stub",
+        llm_latency: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self._setting = RAGSettings()
+        self._top_k = self._setting.retriever.similarity_top_k
+        self._top_k_rerank = self._setting.retriever.top_k_rerank
+        self._num_chunks = num_chunks
+        self._dtype = dtype
+
+        t = time.perf_counter()
+        self._corpus = SyntheticCorpus(num_chunks, seed=seed)
+        self._nodes = self._corpus.nodes()
+        self._queries = self._corpus.queries(min(num_queries, num_chunks))
+        self._embed_model = StubEmbedding(self._corpus.vocabulary, dim=dim, seed=seed)
+        self._embeddings = self._embed_model.embed_ids(self._corpus.word_ids, dtype)
+        self._setup_seconds = time.perf_counter() - t
+
+        Settings.embed_model = self._embed_model
+        self._llm = StubLLM(latency=llm_latency)
+        Settings.llm = self._llm
+        if rerank == "stub":
+            self._rerank = StubRerank(top_n=self._top_k_rerank)
+        else:
+            self._rerank = get_rerank_model(self._setting)
+
+    def _vector_store(self) -> NumpyVectorStore:
+        return NumpyVectorStore(blocks=[(self._nodes, self._embeddings)])
+
+    def _time_queries(self, fn) -> dict:
+        latencies, hits = [], 0
+        start = time.perf_counter()
+        for query, relevant_id in self._queries:
+            t = time.perf_counter()
+            nodes = fn(query)
+            latencies.append(time.perf_counter() - t)
+            hits += any(n.node.node_id == relevant_id for n in nodes)
+        result = latency_stats(latencies, time.perf_counter() - start)
+        result["hit_rate"] = round(hits / len(self._queries), 4)
+        return result
+
+    def bench_build(self) -> dict:
+        t = time.perf_counter()
+        LocalRetriever(self._setting).get_retrievers(
+            nodes=self._nodes, llm=self._llm, vector_store=self._vector_store()
+        )
+        return {
+            "seconds": round(time.perf_counter() - t, 4),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+
+    def run(self) -> dict:
+        results = {
+            "setup": {
+                "seconds": round(self._setup_seconds, 4),
+                "peak_rss_mb": round(peak_rss_mb(), 1),
+            }
+        }
+        print(f"[{self._num_chunks}] build")
+        results["build"] = self.bench_build()
+
+        print(f"[{self._num_chunks}] bm25")
+        t = time.perf_counter()
+        bm25 = BM25Retriever.from_defaults(
+            nodes=self._nodes, similarity_top_k=self._top_k
+        )
+        results["bm25_build"] = {"seconds": round(time.perf_counter() - t, 4)}
+        results["bm25"] = self._time_queries(bm25.retrieve)
+
+        print(f"[{self._num_chunks}] vector")
+        vector = VectorIndexRetriever(
+            index=VectorStoreIndex.from_vector_store(self._vector_store()),
+            similarity_top_k=self._top_k,
+            embed_model=self._embed_model,
+        )
+        results["vector"] = self._time_queries(vector.retrieve)
+
+        print(f"[{self._num_chunks}] fusion")
+        fusion = FusionRetriever(
+            retrievers=[bm25, vector],
+            retriever_weights=self._setting.retriever.retriever_weights,
+            llm=self._llm,
+            query_gen_prompt=get_query_gen_prompt("eng"),
+            similarity_top_k=self._top_k,
+            num_queries=self._setting.retriever.num_queries,
+            mode=self._setting.retriever.fusion_mode,
+        )
+        results["fusion"] = self._time_queries(fusion.retrieve)
+
+        print(f"[{self._num_chunks}] rerank")
+        fused = {query: fusion.retrieve(query) for query, _ in self._queries}
+        results["rerank"] = self._time_queries(
+            lambda query: self._rerank.postprocess_nodes(
+                [NodeWithScore(node=n.node, score=n.score) for n in fused[query]],
+                QueryBundle(query),
+            )
+        )
+        return results
+
+
+def compare(current: dict, baseline: dict) -> None:
+    """Print p95 / build time ratios of two result files (current / baseline)."""
+    for size, stages in current["results"].items():
+        base = baseline["results"].get(size)
+        if base is None:
+            continue
+        for stage, metrics in stages.items():
+            key = "p95_ms" if "p95_ms" in metrics else "seconds"
+            if stage in base and base[stage].get(key):
+                ratio = metrics[key] / base[stage][key]
+                print(f"{size:>9} {stage:<12} {key:<8} {ratio:6.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 100000],
+        help="Corpus sizes (number of chunks) to benchmark",
+    )
+    parser.add_argument(
+        "--queries", type=int, default=200, help="Number of queries per size"
+    )
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    parser.add_argument(
+        "--dtype",
+        type=str,
+        default="float32",
+        choices=["float32", "float16"],
+        help="Embedding storage dtype",
+    )
+    parser.add_argument(
+        "--rerank",
+        type=str,
+        default="stub",
+        choices=["stub", "model"],
+        help="Use the stub reranker or the configured cross-encoder",
+    )
+    parser.add_argument(
+        "--llm-latency",
+        type=float,
+        default=0.0,
+        help="Seconds the stub LLM sleeps per call",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="bench_result.json",
+        help="Where to write the JSON results",
+    )
+    parser.add_argument(
+        "--compare", type=str, default=None, help="Baseline result file to compare"
+    )
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": {},
+    }
+    for size in args.sizes:
+        benchmark = RetrievalBenchmark(
+            num_chunks=size,
+            num_queries=args.queries,
+            dim=args.dim,
+            dtype=args.dtype,
+            rerank=args.rerank,
+            llm_latency=args.llm_latency,
+            seed=args.seed,
+        )
+        report["results"][str(size)] = benchmark.run()
+        print(json.dumps(report["results"][str(size)], indent=2))
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
@@ -0,0 +1,188 @@
+import re
+import time
+import numpy as np
+from typing import Any, List, Sequence, Tuple
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.llms import (
+    CompletionResponse,
+    CompletionResponseGen,
+    CustomLLM,
+    LLMMetadata,
+)
+from llama_index.core.llms.callbacks import llm_completion_callback
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+LETTERS = "bcdfghjklmnprstvz"
+VOWELS = "aeiou"
+
+
+def make_vocabulary(size: int) -> List[str]:
+    """Deterministic pronounceable pseudo-words, e.g. 'bakote'."""
+    words = []
+    for i in range(size):
+        word = ""
+        n = i
+        while True:
+            word += LETTERS[n % len(LETTERS)] + VOWELS[(n // len(LETTERS)) % 5]
+            n //= len(LETTERS) * 5
+            if n == 0:
+                break
+        words.append(word + "s")
+    return words
+
+
+class SyntheticCorpus:
+    """
+    Zipf-distributed synthetic chunks with known query -> chunk relevance.
+
+    Word ids are kept alongside the text so the stub embedder can embed the
+    whole corpus with vectorised lookups instead of re-tokenising.
+    """
+
+    def __init__(
+        self,
+        num_chunks: int,
+        chunk_words: int = 64,
+        vocab_size: int = 20000,
+        zipf_a: float = 1.1,
+        seed: int = 0,
+    ) -> None:
+        rng = np.random.default_rng(seed)
+        self.vocabulary = make_vocabulary(vocab_size)
+        ranks = np.arange(1, vocab_size + 1, dtype=np.float64)
+        probs = ranks**-zipf_a
+        probs /= probs.sum()
+        # Shuffle so frequent words aren't all the shortest ones
+        word_order = rng.permutation(vocab_size)
+        self.word_ids = word_order[
+            rng.choice(vocab_size, size=(num_chunks, chunk_words), p=probs)
+        ].astype(np.int32)
+        self._rng = rng
+
+    def __len__(self) -> int:
+        return len(self.word_ids)
+
+    def text(self, ids: Sequence[int]) -> str:
+        return " ".join(self.vocabulary[i] for i in ids)
+
+    def nodes(self) -> List[TextNode]:
+        return [
+            TextNode(text=self.text(ids), id_=f"chunk-{i}", metadata={"chunk": i})
+            for i, ids in enumerate(self.word_ids)
+        ]
+
+    def queries(self, num_queries: int, query_words: int = 8) -> List[Tuple[str, str]]:
+        """(query, relevant node id) pairs sampled from random chunk spans."""
+        chunk_ids = self._rng.choice(len(self), size=num_queries, replace=False)
+        pairs = []
+        for chunk_id in chunk_ids:
+            ids = self.word_ids[chunk_id]
+            start = self._rng.integers(0, max(len(ids) - query_words, 0) + 1)
+            query = self.text(ids[start : start + query_words])
+            pairs.append((query, f"chunk-{chunk_id}"))
+        return pairs
+
+
+class StubEmbedding(BaseEmbedding):
+    """Deterministic bag-of-words embedding: the sum of fixed random word vectors."""
+
+    _word_index: dict = PrivateAttr()
+    _word_vectors: Any = PrivateAttr()
+
+    def __init__(
+        self, vocabulary: List[str], dim: int = 384, seed: int = 0, **kwargs: Any
+    ) -> None:
+        super().__init__(model_name="stub", **kwargs)
+        rng = np.random.default_rng(seed + 1)
+        self._word_index = {word: i for i, word in enumerate(vocabulary)}
+        self._word_vectors = rng.standard_normal((len(vocabulary), dim)).astype(
+            np.float32
+        )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StubEmbedding"
+
+    def embed_ids(self, word_ids: np.ndarray, dtype: str = "float32") -> np.ndarray:
+        # Row-wise sum of word vectors, in batches to bound the temporary
+        out = np.empty((len(word_ids), self._word_vectors.shape[1]), dtype=dtype)
+        for start in range(0, len(word_ids), 4096):
+            batch = word_ids[start : start + 4096]
+            out[start : start + len(batch)] = self._word_vectors[batch].sum(axis=1)
+        return out
+
+    def _embed(self, text: str) -> List[float]:
+        ids = [self._word_index[w] for w in text.split() if w in self._word_index]
+        if not ids:
+            return [0.0] * self._word_vectors.shape[1]
+        return self._word_vectors[ids].sum(axis=0).tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class StubLLM(CustomLLM):
+    """
+    Offline LLM for benchmarks.
+
+    Answers query generation prompts with word-rotated variants of the
+    original query and sleeps for `latency` seconds per call.
+    """
+
+    latency: float = 0.0
+    num_output: int = 256
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(num_output=self.num_output, model_name="stub")
+
+    def _answer(self, prompt: str) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        match = re.search(r"^### [^:\n]*: (.+)$", prompt, re.MULTILINE)
+        query = match.group(1).split() if match else prompt.split()[-8:]
+        return "\n".join(
+            " ".join(query[i:] + query[:i]) for i in range(1, len(query) + 1)
+        )
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        return CompletionResponse(text=self._answer(prompt))
+
+    @llm_completion_callback()
+    def stream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponseGen:
+        text = ""
+        for token in self._answer(prompt).split(" "):
+            text += token + " "
+            yield CompletionResponse(text=text, delta=token + " ")
+
+
+class StubRerank(BaseNodePostprocessor):
+    """Reranks by query term overlap, a stand-in for the cross-encoder."""
+
+    top_n: int = 6
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StubRerank"
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: QueryBundle | None = None,
+    ) -> List[NodeWithScore]:
+        terms = set(query_bundle.query_str.split()) if query_bundle else set()
+        for node in nodes:
+            words = node.node.get_content().split()
+            node.score = sum(word in terms for word in words) / max(len(words), 1)
+        return sorted(nodes, key=lambda node: node.score, reverse=True)[: self.top_n]
@@ -1,4 +1,4 @@
-from .embedding import LocalEmbedding
+from .embedding import LocalEmbedding, LazyEmbedding
 from .model import LocalRAGModel
 from .ingestion import LocalDataIngestion
 from .vector_store import LocalVectorStore
@@ -7,6 +7,7 @@ from .prompt import get_system_prompt
 
 __all__ = [
     "LocalEmbedding",
+    "LazyEmbedding",
     "LocalRAGModel",
     "LocalDataIngestion",
     "LocalVectorStore",
@@ -1,5 +1,6 @@
-from .embedding import LocalEmbedding
+from .embedding import LocalEmbedding, LazyEmbedding
 
 __all__ = [
     "LocalEmbedding",
+    "LazyEmbedding",
 ]
@@ -1,9 +1,9 @@
 import os
-import torch
+import threading
 import requests
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.embeddings.openai import OpenAIEmbedding
-from transformers import AutoModel, AutoTokenizer
+from typing import Any, Callable, List
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
 from ...setting import RAGSettings
 from dotenv import load_dotenv
 
@@ -11,12 +11,70 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+class LazyEmbedding(BaseEmbedding):
+    """Embedding proxy that builds the real model on first use."""
+
+    _factory: Callable[[], BaseEmbedding] = PrivateAttr()
+    _model: BaseEmbedding | None = PrivateAttr()
+    _lock: Any = PrivateAttr()
+
+    def __init__(self, factory: Callable[[], BaseEmbedding], **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._factory = factory
+        self._model = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LazyEmbedding"
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self) -> BaseEmbedding:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._factory()
+        return self._model
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self.load()._get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await self.load()._aget_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self.load()._get_text_embedding(text)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return await self.load()._aget_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self.load()._get_text_embeddings(texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await self.load()._aget_text_embeddings(texts)
+
+
 class LocalEmbedding:
     @staticmethod
-    def set(setting: RAGSettings | None = None, **kwargs):
+    def set(setting: RAGSettings | None = None, lazy: bool = False, **kwargs):
         setting = setting or RAGSettings()
+        if lazy:
+            return LazyEmbedding(
+                factory=lambda: LocalEmbedding.set(setting),
+                model_name=setting.ingestion.embed_llm,
+                embed_batch_size=setting.ingestion.embed_batch_size,
+            )
         model_name = setting.ingestion.embed_llm
         if model_name != "text-embedding-ada-002":
+            # Heavy imports are deferred until a model is actually built
+            import torch
+            from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+            from transformers import AutoModel, AutoTokenizer
+
             return HuggingFaceEmbedding(
                 model=AutoModel.from_pretrained(
                     model_name, torch_dtype=torch.float16, trust_remote_code=True
@@ -29,6 +87,8 @@ class LocalEmbedding:
                 embed_batch_size=setting.ingestion.embed_batch_size,
             )
         else:
+            from llama_index.embeddings.openai import OpenAIEmbedding
+
             return OpenAIEmbedding()
 
     @staticmethod
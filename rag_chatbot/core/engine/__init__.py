@@ -1,4 +1,4 @@
 from .engine import LocalChatEngine
-from .retriever import LocalRetriever
+from .retriever import LocalRetriever, get_rerank_model
 
-__all__ = ["LocalChatEngine", "LocalRetriever"]
+__all__ = ["LocalChatEngine", "LocalRetriever", "get_rerank_model"]
@@ -1,10 +1,28 @@
+import copy
 from llama_index.core.chat_engine import CondensePlusContextChatEngine, SimpleChatEngine
 from llama_index.core.memory import ChatMemoryBuffer
+from llama_index.core.llms import ChatMessage
 from llama_index.core.llms.llm import LLM
 from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import BasePydanticVectorStore
 from typing import List
 from .retriever import LocalRetriever
 from ...setting import RAGSettings
+from ...tracing import trace_span
+
+
+class TracedCondensePlusContextChatEngine(CondensePlusContextChatEngine):
+    def _condense_question(
+        self, chat_history: List[ChatMessage], latest_message: str
+    ) -> str:
+        with trace_span("condense", history_len=len(chat_history)):
+            return super()._condense_question(chat_history, latest_message)
+
+    async def _acondense_question(
+        self, chat_history: List[ChatMessage], latest_message: str
+    ) -> str:
+        with trace_span("condense", history_len=len(chat_history)):
+            return await super()._acondense_question(chat_history, latest_message)
 
 
 class LocalChatEngine:
@@ -21,6 +39,7 @@ class LocalChatEngine:
         llm: LLM,
         nodes: List[BaseNode],
         language: str = "eng",
+        vector_store: BasePydanticVectorStore | None = None,
     ) -> CondensePlusContextChatEngine | SimpleChatEngine:
         # Normal chat engine
         if len(nodes) == 0:
@@ -33,10 +52,25 @@ class LocalChatEngine:
 
         # Chat engine with documents
         retriever = self._retriever.get_retrievers(
-            llm=llm, language=language, nodes=nodes
+            llm=llm, language=language, nodes=nodes, vector_store=vector_store
         )
-        return CondensePlusContextChatEngine.from_defaults(
+        return TracedCondensePlusContextChatEngine.from_defaults(
             retriever=retriever,
             llm=llm,
             memory=ChatMemoryBuffer(token_limit=self._setting.ollama.chat_token_limit),
         )
+
+    def fork_engine(
+        self, engine: CondensePlusContextChatEngine | SimpleChatEngine
+    ) -> CondensePlusContextChatEngine | SimpleChatEngine:
+        """
+        Copy of `engine` with a memory of its own.
+
+        The retriever and LLM are shared, so forking is cheap, and concurrent
+        conversations no longer overwrite each other's history.
+        """
+        forked = copy.copy(engine)
+        forked._memory = ChatMemoryBuffer(
+            token_limit=self._setting.ollama.chat_token_limit
+        )
+        return forked
@@ -1,4 +1,5 @@
-from typing import List
+import threading
+from typing import Any, List
 from dotenv import load_dotenv
 from llama_index.core.retrievers import (
     BaseRetriever,
@@ -13,15 +14,88 @@ from llama_index.core.tools import RetrieverTool
 from llama_index.core.selectors import LLMSingleSelector
 from llama_index.core.schema import BaseNode, NodeWithScore, QueryBundle, IndexNode
 from llama_index.core.llms.llm import LLM
+from llama_index.core.vector_stores.types import BasePydanticVectorStore
 from llama_index.retrievers.bm25 import BM25Retriever
 from llama_index.core import Settings, VectorStoreIndex
 from ..prompt import get_query_gen_prompt
 from ...setting import RAGSettings
+from ...tracing import trace_span
 
 load_dotenv()
 
+_RERANK_MODELS: dict = {}
+_RERANK_LOCK = threading.Lock()
 
-class TwoStageRetriever(QueryFusionRetriever):
+
+def get_rerank_model(setting: RAGSettings | None = None) -> SentenceTransformerRerank:
+    # Cross-encoders are expensive to load, so share one per model/top_n
+    setting = setting or RAGSettings()
+    key = (setting.retriever.rerank_llm, setting.retriever.top_k_rerank)
+    with _RERANK_LOCK:
+        if key not in _RERANK_MODELS:
+            _RERANK_MODELS[key] = SentenceTransformerRerank(
+                top_n=setting.retriever.top_k_rerank,
+                model=setting.retriever.rerank_llm,
+            )
+        return _RERANK_MODELS[key]
+
+
+class TracedRetriever(BaseRetriever):
+    """Records a named span around every call of the wrapped retriever."""
+
+    def __init__(self, retriever: BaseRetriever, name: str) -> None:
+        super().__init__(callback_manager=retriever.callback_manager)
+        self._retriever = retriever
+        self._name = name
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        with trace_span(self._name) as span:
+            nodes = self._retriever.retrieve(query_bundle)
+            if span is not None:
+                span["attributes"]["num_nodes"] = len(nodes)
+        return nodes
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        with trace_span(self._name) as span:
+            nodes = await self._retriever.aretrieve(query_bundle)
+            if span is not None:
+                span["attributes"]["num_nodes"] = len(nodes)
+        return nodes
+
+
+class TracedSingleSelector(LLMSingleSelector):
+    def _select(self, choices: Any, query: QueryBundle) -> Any:
+        with trace_span("router_select"):
+            return super()._select(choices, query)
+
+    async def _aselect(self, choices: Any, query: QueryBundle) -> Any:
+        with trace_span("router_select"):
+            return await super()._aselect(choices, query)
+
+
+class FusionRetriever(QueryFusionRetriever):
+    """QueryFusionRetriever with query generation and fusion traced."""
+
+    def _get_queries(self, original_query: str) -> List[QueryBundle]:
+        with trace_span("query_gen", num_queries=self.num_queries):
+            return super()._get_queries(original_query)
+
+    def _reciprocal_rerank_fusion(self, results: Any) -> List[NodeWithScore]:
+        with trace_span("fusion", mode="reciprocal_rerank"):
+            return super()._reciprocal_rerank_fusion(results)
+
+    def _relative_score_fusion(
+        self, results: Any, dist_based: bool | None = False
+    ) -> List[NodeWithScore]:
+        with trace_span("fusion", mode="relative_score"):
+            return super()._relative_score_fusion(results, dist_based=dist_based)
+
+    def _simple_fusion(self, results: Any) -> List[NodeWithScore]:
+        with trace_span("fusion", mode="simple"):
+            return super()._simple_fusion(results)
+
+
+class TwoStageRetriever(FusionRetriever):
     def __init__(
         self,
         retrievers: List[BaseRetriever],
@@ -53,10 +127,10 @@ class TwoStageRetriever(QueryFusionRetriever):
             retriever_weights,
         )
         self._setting = setting or RAGSettings()
-        self._rerank_model = SentenceTransformerRerank(
-            top_n=self._setting.retriever.top_k_rerank,
-            model=self._setting.retriever.rerank_llm,
-        )
+
+    @property
+    def _rerank_model(self) -> SentenceTransformerRerank:
+        return get_rerank_model(self._setting)
 
     def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
         queries: List[QueryBundle] = [query_bundle]
@@ -68,7 +142,8 @@ class TwoStageRetriever(QueryFusionRetriever):
         else:
             results = self._run_sync_queries(queries)
         results = self._simple_fusion(results)
-        return self._rerank_model.postprocess_nodes(results, query_bundle)
+        with trace_span("rerank", num_nodes=len(results)):
+            return self._rerank_model.postprocess_nodes(results, query_bundle)
 
     async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
         queries: List[QueryBundle] = [query_bundle]
@@ -77,7 +152,8 @@ class TwoStageRetriever(QueryFusionRetriever):
 
         results = await self._run_async_queries(queries)
         results = self._simple_fusion(results)
-        return self._rerank_model.postprocess_nodes(results, query_bundle)
+        with trace_span("rerank", num_nodes=len(results)):
+            return self._rerank_model.postprocess_nodes(results, query_bundle)
 
 
 class LocalRetriever:
@@ -95,37 +171,51 @@ class LocalRetriever:
         language: str = "eng",
     ):
         llm = llm or Settings.llm
-        return VectorIndexRetriever(
-            index=vector_index,
+        return TracedRetriever(
+            VectorIndexRetriever(
+                index=vector_index,
+                similarity_top_k=self._setting.retriever.similarity_top_k,
+                embed_model=Settings.embed_model,
+                verbose=True,
+            ),
+            name="vector_search",
+        )
+
+    def _get_bm25_retriever(self, nodes: List[BaseNode]) -> BM25Retriever:
+        return BM25Retriever.from_defaults(
+            nodes=nodes,
             similarity_top_k=self._setting.retriever.similarity_top_k,
-            embed_model=Settings.embed_model,
             verbose=True,
         )
 
     def _get_hybrid_retriever(
         self,
         vector_index: VectorStoreIndex,
+        nodes: List[BaseNode],
         llm: LLM | None = None,
         language: str = "eng",
         gen_query: bool = True,
+        bm25_retriever: BM25Retriever | None = None,
     ):
         # VECTOR INDEX RETRIEVER
-        vector_retriever = VectorIndexRetriever(
-            index=vector_index,
-            similarity_top_k=self._setting.retriever.similarity_top_k,
-            embed_model=Settings.embed_model,
-            verbose=True,
+        vector_retriever = TracedRetriever(
+            VectorIndexRetriever(
+                index=vector_index,
+                similarity_top_k=self._setting.retriever.similarity_top_k,
+                embed_model=Settings.embed_model,
+                verbose=True,
+            ),
+            name="vector_search",
         )
 
-        bm25_retriever = BM25Retriever.from_defaults(
-            index=vector_index,
-            similarity_top_k=self._setting.retriever.similarity_top_k,
-            verbose=True,
+        bm25_retriever = TracedRetriever(
+            bm25_retriever or self._get_bm25_retriever(nodes),
+            name="bm25",
         )
 
         # FUSION RETRIEVER
         if gen_query:
-            hybrid_retriever = QueryFusionRetriever(
+            hybrid_retriever = FusionRetriever(
                 retrievers=[bm25_retriever, vector_retriever],
                 retriever_weights=self._setting.retriever.retriever_weights,
                 llm=llm,
@@ -152,26 +242,30 @@ class LocalRetriever:
     def _get_router_retriever(
         self,
         vector_index: VectorStoreIndex,
+        nodes: List[BaseNode],
         llm: LLM | None = None,
         language: str = "eng",
+        bm25_retriever: BM25Retriever | None = None,
     ):
+        # Both tools search the same nodes, so they share one BM25 index
+        bm25_retriever = bm25_retriever or self._get_bm25_retriever(nodes)
         fusion_tool = RetrieverTool.from_defaults(
             retriever=self._get_hybrid_retriever(
-                vector_index, llm, language, gen_query=True
+                vector_index, nodes, llm, language, True, bm25_retriever
             ),
             description="Use this tool when the user's query is ambiguous or unclear.",
             name="Fusion Retriever with BM25 and Vector Retriever and LLM Query Generation.",
         )
         two_stage_tool = RetrieverTool.from_defaults(
             retriever=self._get_hybrid_retriever(
-                vector_index, llm, language, gen_query=False
+                vector_index, nodes, llm, language, False, bm25_retriever
             ),
             description="Use this tool when the user's query is clear and unambiguous.",
             name="Two Stage Retriever with BM25 and Vector Retriever and LLM Rerank.",
         )
 
         return RouterRetriever.from_defaults(
-            selector=LLMSingleSelector.from_defaults(llm=llm),
+            selector=TracedSingleSelector.from_defaults(llm=llm),
             retriever_tools=[fusion_tool, two_stage_tool],
             llm=llm,
         )
@@ -181,10 +275,20 @@ class LocalRetriever:
         nodes: List[BaseNode],
         llm: LLM | None = None,
         language: str = "eng",
+        vector_store: BasePydanticVectorStore | None = None,
+        vector_index: VectorStoreIndex | None = None,
+        bm25_retriever: BM25Retriever | None = None,
     ):
-        vector_index = VectorStoreIndex(nodes=nodes)
+        # A vector store that already holds the node embeddings avoids
+        # copying (or recomputing) them into a new index.
+        if vector_index is None and vector_store is not None:
+            vector_index = VectorStoreIndex.from_vector_store(vector_store)
+        elif vector_index is None:
+            vector_index = VectorStoreIndex(nodes=nodes)
         if len(nodes) > self._setting.retriever.top_k_rerank:
-            retriever = self._get_router_retriever(vector_index, llm, language)
+            retriever = self._get_router_retriever(
+                vector_index, nodes, llm, language, bm25_retriever
+            )
         else:
             retriever = self._get_normal_retriever(vector_index, llm, language)
 
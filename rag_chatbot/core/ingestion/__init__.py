@@ -1,5 +1,8 @@
 from .ingestion import LocalDataIngestion
+from .worker import IngestionJob, IngestionWorker
 
 __all__ = [
     "LocalDataIngestion",
+    "IngestionJob",
+    "IngestionWorker",
 ]
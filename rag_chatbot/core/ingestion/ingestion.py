@@ -1,20 +1,28 @@
 import re
+import uuid
 import fitz
+import numpy as np
 from llama_index.core import Document, Settings
 from llama_index.core.schema import BaseNode
 from llama_index.core.node_parser import SentenceSplitter
 from dotenv import load_dotenv
-from typing import Any, List
+from typing import Any, Callable, List
 from tqdm import tqdm
+from .node_store import NodeStore
+from ..vector_store import NumpyVectorStore
+from ...profiling import Profiler
 from ...setting import RAGSettings
 
 load_dotenv()
 
 
 class LocalDataIngestion:
-    def __init__(self, setting: RAGSettings | None = None) -> None:
+    def __init__(
+        self, setting: RAGSettings | None = None, profiler: Profiler | None = None
+    ) -> None:
         self._setting = setting or RAGSettings()
-        self._node_store = {}
+        self._profiler = profiler or Profiler()
+        self._node_store = NodeStore(dtype=self._setting.ingestion.embed_dtype)
         self._ingested_file = []
 
     def _filter_text(self, text):
@@ -33,60 +41,200 @@ class LocalDataIngestion:
         input_files: list[str],
         embed_nodes: bool = True,
         embed_model: Any | None = None,
+        progress_callback: Callable[[str, str, float], None] | None = None,
+    ) -> List[BaseNode]:
+        # progress_callback(file_name, stage, fraction) is called as each file
+        # moves through the reading, splitting and embedding stages.
+        with self._profiler.profile("ingestion", label=", ".join(input_files)):
+            return self._store_nodes(
+                input_files, embed_nodes, embed_model, progress_callback
+            )
+
+    def _store_nodes(
+        self,
+        input_files: list[str],
+        embed_nodes: bool,
+        embed_model: Any | None,
+        progress_callback: Callable[[str, str, float], None] | None,
     ) -> List[BaseNode]:
         return_nodes = []
-        self._ingested_file = []
+        ingested_file = []
         if len(input_files) == 0:
+            self._ingested_file = ingested_file
             return return_nodes
-        splitter = SentenceSplitter.from_defaults(
-            chunk_size=self._setting.ingestion.chunk_size,
-            chunk_overlap=self._setting.ingestion.chunk_overlap,
-            paragraph_separator=self._setting.ingestion.paragraph_sep,
-            secondary_chunking_regex=self._setting.ingestion.chunking_regex,
-        )
+        progress_callback = progress_callback or (lambda *args: None)
+        splitter = self.get_splitter()
         if embed_nodes:
             Settings.embed_model = embed_model or Settings.embed_model
         for input_file in tqdm(input_files, desc="Ingesting data"):
             file_name = input_file.strip().split("/")[-1]
-            self._ingested_file.append(file_name)
+            ingested_file.append(file_name)
             if file_name in self._node_store:
-                return_nodes.extend(self._node_store[file_name])
-            else:
-                document = fitz.open(input_file)
-                all_text = ""
-                for doc_idx, page in enumerate(document):
-                    page_text = page.get_text("text")
-                    page_text = self._filter_text(page_text)
-                    all_text += " " + page_text
-                document = Document(
-                    text=all_text.strip(),
-                    metadata={
-                        "file_name": file_name,
-                    },
+                return_nodes.extend(self._node_store.get_nodes([file_name]))
+            elif self._should_stream(input_file):
+                nodes = self._stream_nodes(
+                    input_file, splitter, embed_nodes, progress_callback
                 )
-
+                return_nodes.extend(nodes)
+                progress_callback(file_name, "done", 1.0)
+            else:
+                document = self.read_document(input_file, progress_callback)
+                progress_callback(file_name, "splitting", 0.0)
                 nodes = splitter([document], show_progress=True)
                 if embed_nodes:
-                    nodes = Settings.embed_model(nodes, show_progress=True)
-                self._node_store[file_name] = nodes
+                    nodes = self._embed_nodes(file_name, nodes, progress_callback)
+                self._node_store.add(file_name, nodes)
                 return_nodes.extend(nodes)
+                progress_callback(file_name, "done", 1.0)
+        # Publish the new file list in one assignment so concurrent readers
+        # never observe a partially built ingestion.
+        self._ingested_file = ingested_file
+        return return_nodes
+
+    def get_splitter(self) -> SentenceSplitter:
+        return SentenceSplitter.from_defaults(
+            chunk_size=self._setting.ingestion.chunk_size,
+            chunk_overlap=self._setting.ingestion.chunk_overlap,
+            paragraph_separator=self._setting.ingestion.paragraph_sep,
+            secondary_chunking_regex=self._setting.ingestion.chunking_regex,
+        )
+
+    def read_document(
+        self,
+        input_file: str,
+        progress_callback: Callable[[str, str, float], None] | None = None,
+    ) -> Document:
+        file_name = input_file.strip().split("/")[-1]
+        progress_callback = progress_callback or (lambda *args: None)
+        progress_callback(file_name, "reading", 0.0)
+        document = fitz.open(input_file)
+        num_pages = max(len(document), 1)
+        all_text = ""
+        for doc_idx, page in enumerate(document):
+            page_text = page.get_text("text")
+            page_text = self._filter_text(page_text)
+            all_text += " " + page_text
+            progress_callback(file_name, "reading", (doc_idx + 1) / num_pages)
+        return Document(
+            text=all_text.strip(),
+            metadata={
+                "file_name": file_name,
+            },
+        )
+
+    def _should_stream(self, input_file: str) -> bool:
+        min_pages = self._setting.ingestion.stream_min_pages
+        if min_pages <= 0:
+            return False
+        with fitz.open(input_file) as document:
+            return len(document) > min_pages
+
+    def _stream_nodes(
+        self,
+        input_file: str,
+        splitter: SentenceSplitter,
+        embed_nodes: bool,
+        progress_callback: Callable[[str, str, float], None],
+    ) -> List[BaseNode]:
+        """
+        Split, embed and store a large document a window of pages at a time.
+
+        The last chunk of a window may be cut off at the window boundary, so
+        its text is carried over and re-split with the next window. Only one
+        window of text and nodes is in flight at a time.
+        """
+        file_name = input_file.strip().split("/")[-1]
+        window_pages = max(self._setting.ingestion.stream_window_pages, 1)
+        # One document id for every window, so all nodes share a ref_doc_id
+        doc_id = str(uuid.uuid4())
+        return_nodes = []
+        carry = ""
+        offset = 0
+        try:
+            with fitz.open(input_file) as document:
+                num_pages = max(len(document), 1)
+                for start in range(0, len(document), window_pages):
+                    end = min(start + window_pages, len(document))
+                    pages = [
+                        self._filter_text(document[i].get_text("text"))
+                        for i in range(start, end)
+                    ]
+                    text = " ".join([carry, *pages]).strip()
+                    last_window = end == len(document)
+                    nodes = splitter(
+                        [
+                            Document(
+                                id_=doc_id,
+                                text=text,
+                                metadata={"file_name": file_name},
+                            )
+                        ]
+                    )
+                    if not last_window and nodes:
+                        tail = nodes.pop()
+                        tail_start = tail.start_char_idx
+                        if tail_start is None:
+                            tail_start = max(text.rfind(tail.get_content()), 0)
+                        carry = text[tail_start:]
+                        window_offset, offset = offset, offset + tail_start
+                    else:
+                        window_offset = offset
+                    for node in nodes:
+                        if node.start_char_idx is not None:
+                            node.start_char_idx += window_offset
+                        if node.end_char_idx is not None:
+                            node.end_char_idx += window_offset
+                    if embed_nodes and nodes:
+                        nodes = Settings.embed_model(nodes)
+                    self._node_store.append(file_name, nodes)
+                    return_nodes.extend(nodes)
+                    progress_callback(file_name, "streaming", end / num_pages)
+        except BaseException:
+            self._node_store.discard(file_name)
+            raise
+        self._node_store.commit(file_name)
         return return_nodes
 
+    def _embed_nodes(
+        self,
+        file_name: str,
+        nodes: List[BaseNode],
+        progress_callback: Callable[[str, str, float], None],
+    ) -> List[BaseNode]:
+        # Embed in slices so progress can be reported while a file is embedding
+        step = self._setting.ingestion.embed_batch_size * 16
+        embedded = []
+        for start in range(0, len(nodes), step):
+            progress_callback(file_name, "embedding", start / len(nodes))
+            embedded.extend(Settings.embed_model(nodes[start : start + step]))
+        return embedded
+
+    def add_nodes(
+        self, name: str, nodes: List[BaseNode], embeddings: np.ndarray | None = None
+    ) -> None:
+        """Ingest nodes split (and possibly embedded) elsewhere as the only file."""
+        self._node_store.add(name, nodes, embeddings)
+        self._ingested_file = [name]
+
     def reset(self):
-        self._node_store = {}
+        self._node_store.reset()
         self._ingested_file = []
 
     def check_nodes_exist(self):
-        return len(self._node_store.values()) > 0
+        return len(self._node_store) > 0
 
     def get_all_nodes(self):
-        return_nodes = []
-        for nodes in self._node_store.values():
-            return_nodes.extend(nodes)
-        return return_nodes
+        return self._node_store.get_nodes()
 
     def get_ingested_nodes(self):
-        return_nodes = []
-        for file in self._ingested_file:
-            return_nodes.extend(self._node_store[file])
-        return return_nodes
+        return self._node_store.get_nodes(self._ingested_file)
+
+    def get_ingested_embeddings(self):
+        return self._node_store.get_embeddings(self._ingested_file)
+
+    def get_vector_store(self) -> NumpyVectorStore | None:
+        # Index the ingested files straight from their embedding arrays
+        blocks = self._node_store.get_blocks(self._ingested_file)
+        if not blocks:
+            return None
+        return NumpyVectorStore(blocks=blocks)
@@ -0,0 +1,117 @@
+import numpy as np
+from typing import Dict, List, Sequence, Tuple
+from llama_index.core.schema import BaseNode
+
+
+Block = Tuple[Tuple[BaseNode, ...], np.ndarray | None]
+
+
+class NodeStore:
+    """
+    Ingested nodes grouped by file.
+
+    The embeddings of a file are kept in contiguous NumPy arrays and the
+    nodes themselves carry no embedding: node i of a block maps to row i.
+    A file is one block, or one block per window when it was streamed in.
+    """
+
+    def __init__(self, dtype: str = "float32") -> None:
+        self._dtype = np.dtype(dtype)
+        self._blocks: Dict[str, List[Block]] = {}
+        self._pending: Dict[str, List[Block]] = {}
+        self._cache: Dict[Tuple[str, ...] | None, Tuple[BaseNode, ...]] = {}
+
+    def __contains__(self, file_name: str) -> bool:
+        return file_name in self._blocks
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def _to_block(self, nodes: Sequence[BaseNode]) -> Block:
+        embeddings = None
+        if len(nodes) > 0 and all(node.embedding is not None for node in nodes):
+            embeddings = np.asarray(
+                [node.embedding for node in nodes], dtype=self._dtype
+            )
+            for node in nodes:
+                node.embedding = None
+        return tuple(nodes), embeddings
+
+    def add(
+        self,
+        file_name: str,
+        nodes: Sequence[BaseNode],
+        embeddings: np.ndarray | None = None,
+    ) -> None:
+        """Store a file; `embeddings`, row i for node i, is used as its block."""
+        if embeddings is None:
+            block = self._to_block(nodes)
+        else:
+            if len(embeddings) != len(nodes):
+                raise ValueError("Number of nodes and embeddings must match")
+            block = tuple(nodes), np.asarray(embeddings, dtype=self._dtype)
+        self._blocks[file_name] = [block]
+        self._cache = {}
+
+    def append(self, file_name: str, nodes: Sequence[BaseNode]) -> None:
+        """Stage a block of a file; it becomes visible on commit(file_name)."""
+        if len(nodes) > 0:
+            self._pending.setdefault(file_name, []).append(self._to_block(nodes))
+
+    def commit(self, file_name: str) -> None:
+        self._blocks[file_name] = self._pending.pop(file_name, [])
+        self._cache = {}
+
+    def discard(self, file_name: str) -> None:
+        self._pending.pop(file_name, None)
+
+    def reset(self) -> None:
+        self._blocks = {}
+        self._pending = {}
+        self._cache = {}
+
+    def _resolve(self, files: Sequence[str] | None) -> Sequence[str]:
+        return list(self._blocks) if files is None else files
+
+    def files(self) -> List[str]:
+        return list(self._blocks.keys())
+
+    def get_nodes(self, files: Sequence[str] | None = None) -> Tuple[BaseNode, ...]:
+        # The concatenation is cached until the store changes
+        key = None if files is None else tuple(files)
+        nodes = self._cache.get(key)
+        if nodes is None:
+            nodes = tuple(
+                node
+                for file in self._resolve(files)
+                for block_nodes, _ in self._blocks[file]
+                for node in block_nodes
+            )
+            self._cache[key] = nodes
+        return nodes
+
+    def get_embeddings(self, files: Sequence[str] | None = None) -> np.ndarray | None:
+        """Embeddings aligned with get_nodes(files), a view for a single block."""
+        blocks = self.get_blocks(files)
+        if blocks is None:
+            return None
+        if len(blocks) == 1:
+            return blocks[0][1]
+        if len(blocks) == 0:
+            return np.empty((0, 0), dtype=self._dtype)
+        return np.concatenate([embeddings for _, embeddings in blocks])
+
+    def get_blocks(
+        self, files: Sequence[str] | None = None
+    ) -> List[Tuple[Tuple[BaseNode, ...], np.ndarray]] | None:
+        """(nodes, embeddings) blocks of the files, None if any isn't embedded."""
+        blocks = []
+        for file in self._resolve(files):
+            for nodes, embeddings in self._blocks[file]:
+                if len(nodes) == 0:
+                    # Files without text (e.g. scanned PDFs) have nothing to embed
+                    continue
+                if embeddings is None:
+                    return None
+                blocks.append((nodes, embeddings))
+        return blocks
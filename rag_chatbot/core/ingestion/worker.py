@@ -0,0 +1,106 @@
+import queue
+import threading
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable, List
+
+
+@dataclass
+class IngestionJob:
+    input_files: List[str]
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:8])
+    status: str = "pending"
+    error: str | None = None
+    progress: dict = field(default_factory=dict)
+
+    def update(self, file_name: str, stage: str, fraction: float = 0.0):
+        self.progress[file_name] = (stage, fraction)
+
+    @property
+    def done(self) -> bool:
+        return self.status in ["completed", "failed"]
+
+    def describe(self) -> str:
+        lines = [f"Job {self.id}: {self.status}"]
+        for file_name, (stage, fraction) in self.progress.items():
+            lines.append(f"  {file_name}: {stage} {fraction * 100:.0f}%")
+        if self.error:
+            lines.append(f"  Error: {self.error}")
+        return "\n".join(lines)
+
+
+class IngestionWorker:
+    """
+    Runs document ingestion on a background thread.
+
+    `store_fn(input_files, progress_callback)` embeds the files and
+    `commit_fn()` swaps in the new retrieval state. Jobs queued while another
+    one is running are processed together and committed once.
+    """
+
+    def __init__(
+        self,
+        store_fn: Callable[..., object],
+        commit_fn: Callable[[], object],
+        max_history: int = 20,
+    ) -> None:
+        self._store_fn = store_fn
+        self._commit_fn = commit_fn
+        self._queue: queue.Queue[IngestionJob] = queue.Queue()
+        self._jobs: List[IngestionJob] = []
+        self._max_history = max_history
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def submit(self, input_files: list[str]) -> IngestionJob:
+        job = IngestionJob(input_files=list(input_files))
+        with self._lock:
+            self._jobs.append(job)
+            self._jobs = self._jobs[-self._max_history :]
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="ingestion-worker", daemon=True
+                )
+                self._thread.start()
+        self._queue.put(job)
+        return job
+
+    def get_jobs(self) -> List[IngestionJob]:
+        with self._lock:
+            return list(self._jobs)
+
+    def get_latest_job(self) -> IngestionJob | None:
+        with self._lock:
+            return self._jobs[-1] if self._jobs else None
+
+    def is_busy(self) -> bool:
+        return any(not job.done for job in self.get_jobs())
+
+    def _run(self):
+        while True:
+            jobs = [self._queue.get()]
+            while True:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stored = []
+            for job in jobs:
+                job.status = "running"
+                try:
+                    self._store_fn(job.input_files, progress_callback=job.update)
+                    stored.append(job)
+                except Exception as e:
+                    job.status = "failed"
+                    job.error = str(e)
+
+            if stored:
+                try:
+                    self._commit_fn()
+                    for job in stored:
+                        job.status = "completed"
+                except Exception as e:
+                    for job in stored:
+                        job.status = "failed"
+                        job.error = str(e)
@@ -1,5 +1,6 @@
-from .model import LocalRAGModel
+from .model import LocalRAGModel, cancel_on
 
 __all__ = [
     "LocalRAGModel",
+    "cancel_on",
 ]
@@ -1,11 +1,62 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
 from llama_index.llms.ollama import Ollama
-from llama_index.llms.openai import OpenAI
 from ...setting import RAGSettings
 from dotenv import load_dotenv
 import requests
 
 load_dotenv()
 
+# Set while answering a query whose generation may be cancelled
+_cancel_event: ContextVar[threading.Event | None] = ContextVar(
+    "cancel_event", default=None
+)
+
+
+@contextmanager
+def cancel_on(event: threading.Event | None):
+    """LLM streams started in this context stop once `event` is set."""
+    token = _cancel_event.set(event)
+    try:
+        yield
+    finally:
+        _cancel_event.reset(token)
+
+
+def _until_cancelled(stream: Iterator[Any], event: threading.Event) -> Iterator[Any]:
+    # Closing the inner stream closes the HTTP response, which makes Ollama
+    # stop generating instead of finishing the answer for nobody
+    try:
+        if event.is_set():
+            return
+        for item in stream:
+            yield item
+            if event.is_set():
+                return
+    finally:
+        stream.close()
+
+
+class CancellableOllama(Ollama):
+    """
+    Ollama whose streams can be cancelled with `cancel_on`.
+
+    llama_index consumes the stream in a thread of its own, so the event is
+    captured when the stream is created, in the context of the query.
+    """
+
+    def stream_chat(self, messages, **kwargs):
+        stream = super().stream_chat(messages, **kwargs)
+        event = _cancel_event.get()
+        return stream if event is None else _until_cancelled(stream, event)
+
+    def stream_complete(self, prompt, formatted: bool = False, **kwargs):
+        stream = super().stream_complete(prompt, formatted=formatted, **kwargs)
+        event = _cancel_event.get()
+        return stream if event is None else _until_cancelled(stream, event)
+
 
 class LocalRAGModel:
     def __init__(self) -> None:
@@ -20,6 +71,8 @@ class LocalRAGModel:
     ):
         setting = setting or RAGSettings()
         if model_name in ["gpt-3.5-turbo", "gpt-4", "gpt-4o", "gpt-4-turbo"]:
+            from llama_index.llms.openai import OpenAI
+
             return OpenAI(model=model_name, temperature=setting.ollama.temperature)
         else:
             settings_kwargs = {
@@ -29,7 +82,7 @@ class LocalRAGModel:
                 "repeat_last_n": setting.ollama.repeat_last_n,
                 "repeat_penalty": setting.ollama.repeat_penalty,
             }
-            return Ollama(
+            return CancellableOllama(
                 model=model_name,
                 system_prompt=system_prompt,
                 base_url=f"http://{host}:{setting.ollama.port}",
@@ -1,5 +1,7 @@
 from .vector_store import LocalVectorStore
+from .numpy_store import NumpyVectorStore
 
 __all__ = [
     "LocalVectorStore",
+    "NumpyVectorStore",
 ]
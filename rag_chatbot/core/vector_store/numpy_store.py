@@ -0,0 +1,140 @@
+import numpy as np
+from typing import Any, Callable, List, Sequence, Tuple
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.simple import _build_metadata_filter_fn
+
+# Rows scored per matmul, bounds the float32 temporary for float16 blocks
+SCORE_CHUNK_SIZE = 65536
+
+
+class NumpyVectorStore(BasePydanticVectorStore):
+    """
+    In-memory vector store backed by contiguous NumPy embedding blocks.
+
+    Each block is a list of nodes plus a (len(nodes), dim) array whose row i is
+    the embedding of node i, so nodes don't need to carry their own embedding.
+    Blocks are used as given (no copy) and scored with cosine similarity.
+    """
+
+    stores_text: bool = True
+    _blocks: List[Tuple[Sequence[BaseNode], np.ndarray, np.ndarray]] = PrivateAttr()
+
+    def __init__(
+        self,
+        blocks: List[Tuple[Sequence[BaseNode], np.ndarray]] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        self._blocks = []
+        for nodes, embeddings in blocks or []:
+            self._add_block(nodes, embeddings)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "NumpyVectorStore"
+
+    @property
+    def client(self) -> None:
+        return None
+
+    def __len__(self) -> int:
+        return sum(len(nodes) for nodes, _, _ in self._blocks)
+
+    def _add_block(self, nodes: Sequence[BaseNode], embeddings: np.ndarray) -> None:
+        if len(nodes) != len(embeddings):
+            raise ValueError("Number of nodes and embeddings must match")
+        if len(nodes) == 0:
+            return
+        norms = np.sqrt(np.einsum("ij,ij->i", embeddings, embeddings, dtype=np.float32))
+        norms[norms == 0] = 1.0
+        self._blocks.append((nodes, embeddings, norms))
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        """Add nodes, moving their embeddings into a new block."""
+        if len(nodes) == 0:
+            return []
+        dtype = self._blocks[0][1].dtype if self._blocks else np.float32
+        embeddings = np.asarray([node.get_embedding() for node in nodes], dtype=dtype)
+        for node in nodes:
+            node.embedding = None
+        self._add_block(list(nodes), embeddings)
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        blocks = self._blocks
+        self._blocks = []
+        for nodes, embeddings, _ in blocks:
+            keep = [i for i, node in enumerate(nodes) if node.ref_doc_id != ref_doc_id]
+            if len(keep) == len(nodes):
+                self._add_block(nodes, embeddings)
+            else:
+                self._add_block([nodes[i] for i in keep], embeddings[keep])
+
+    @staticmethod
+    def _node_filter(query: VectorStoreQuery) -> Callable[[BaseNode], bool] | None:
+        # node_ids and metadata filters; the latter with the semantics of
+        # llama_index's SimpleVectorStore
+        checks = []
+        if query.node_ids is not None:
+            allowed = set(query.node_ids)
+            checks.append(lambda node: node.node_id in allowed)
+        if query.filters is not None and query.filters.filters:
+            checks.append(
+                _build_metadata_filter_fn(lambda node: node.metadata, query.filters)
+            )
+        if not checks:
+            return None
+        return lambda node: all(check(node) for check in checks)
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.query_embedding is None or len(self._blocks) == 0:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        q = np.asarray(query.query_embedding, dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+        scores = np.empty(len(self), dtype=np.float32)
+        owners = []
+        offset = 0
+        for block_idx, (nodes, embeddings, norms) in enumerate(self._blocks):
+            for start in range(0, len(nodes), SCORE_CHUNK_SIZE):
+                end = min(start + SCORE_CHUNK_SIZE, len(nodes))
+                scores[offset + start : offset + end] = (embeddings[start:end] @ q) / (
+                    norms[start:end]
+                )
+            owners.append((offset, block_idx))
+            offset += len(nodes)
+
+        keep = self._node_filter(query)
+        if keep is not None:
+            for block_offset, block_idx in owners:
+                nodes = self._blocks[block_idx][0]
+                for i, node in enumerate(nodes):
+                    if not keep(node):
+                        scores[block_offset + i] = -np.inf
+
+        top_k = min(query.similarity_top_k, len(scores))
+        if top_k <= 0:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+
+        block_offsets = np.array([block_offset for block_offset, _ in owners])
+        result_nodes, similarities, ids = [], [], []
+        for idx in top:
+            if not np.isfinite(scores[idx]):
+                continue
+            pos = int(np.searchsorted(block_offsets, idx, side="right")) - 1
+            block_offset, block_idx = owners[pos]
+            node = self._blocks[block_idx][0][idx - block_offset]
+            result_nodes.append(node)
+            similarities.append(float(scores[idx]))
+            ids.append(node.node_id)
+        return VectorStoreQueryResult(
+            nodes=result_nodes, similarities=similarities, ids=ids
+        )
@@ -0,0 +1,9 @@
+from .nodes import load_corpus_nodes
+from .vectors import build_chunk_vectors, load_chunk_vectors, vectors_path
+
+__all__ = [
+    "build_chunk_vectors",
+    "load_chunk_vectors",
+    "load_corpus_nodes",
+    "vectors_path",
+]
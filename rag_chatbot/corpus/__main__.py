@@ -0,0 +1,36 @@
+import argparse
+from dotenv import load_dotenv
+from ..setting import RAGSettings
+from .vectors import build_chunk_vectors
+
+load_dotenv()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the chunk vectors behind the API's hybrid search"
+    )
+    parser.add_argument(
+        "--db", type=str, default="data/bible.db", help="Path of bible.db"
+    )
+    parser.add_argument(
+        "--embed-model",
+        type=str,
+        default=None,
+        help="Embedding model, defaults to the ingestion setting",
+    )
+    parser.add_argument(
+        "--dtype",
+        type=str,
+        default=None,
+        choices=["float32", "float16"],
+        help="Stored vector dtype, defaults to the ingestion setting",
+    )
+    args = parser.parse_args()
+
+    setting = RAGSettings()
+    if args.embed_model:
+        setting.ingestion.embed_llm = args.embed_model
+    if args.dtype:
+        setting.ingestion.embed_dtype = args.dtype
+    print(build_chunk_vectors(args.db, setting))
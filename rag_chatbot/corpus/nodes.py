@@ -0,0 +1,59 @@
+import sqlite3
+import numpy as np
+from llama_index.core.schema import TextNode
+from .vectors import content_hash, load_chunk_vectors, vectors_path
+
+# Chunk columns kept as node metadata
+METADATA_COLUMNS = [
+    "source_file",
+    "chapter_title",
+    "scene_index",
+    "paragraph_index",
+    "location_name",
+    "primary_characters",
+]
+
+
+def load_corpus_nodes(
+    db_path: str, prefix: str | None = None
+) -> tuple[list[TextNode], np.ndarray | None, str | None]:
+    """
+    The `text_chunks` of a bible.db as nodes, one per chunk, with the chunk id
+    as node id, their (n, dim) embeddings and the embedding model.
+
+    Embeddings are the sidecar rows, in node order, when the sidecar covers
+    every chunk with its current content; otherwise they and the model are
+    None, so the chunks are embedded again rather than mixing stale vectors in.
+    """
+    meta, matrix = load_chunk_vectors(prefix or vectors_path(db_path))
+    rows_by_rowid = {}
+    if meta is not None and len(meta["rowids"]) == matrix.shape[0]:
+        rows_by_rowid = {
+            rowid: (i, h)
+            for i, (rowid, h) in enumerate(zip(meta["rowids"], meta["hashes"]))
+        }
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    rows = conn.execute(
+        f"SELECT rowid, id, content, {', '.join(METADATA_COLUMNS)} "
+        "FROM text_chunks ORDER BY rowid"
+    ).fetchall()
+    conn.close()
+
+    nodes, vector_rows = [], []
+    for rowid, chunk_id, content, *metadata in rows:
+        nodes.append(
+            TextNode(
+                id_=chunk_id,
+                text=content or "",
+                metadata=dict(zip(METADATA_COLUMNS, metadata)),
+                excluded_embed_metadata_keys=METADATA_COLUMNS,
+            )
+        )
+        row, h = rows_by_rowid.get(rowid, (None, None))
+        vector_rows.append(row if h == content_hash(content or "") else None)
+
+    if not nodes or None in vector_rows:
+        return nodes, None, None
+    # One gather out of the memory-mapped matrix, no per-node lists
+    return nodes, matrix[np.asarray(vector_rows)], meta["embed_model"]
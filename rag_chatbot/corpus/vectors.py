@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import sqlite3
+import numpy as np
+from tqdm import tqdm
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from ..core.embedding import LocalEmbedding
+from ..setting import RAGSettings
+
+# Rows read and embedded at a time
+BATCH_SIZE = 256
+
+
+def vectors_path(db_path: str) -> str:
+    """
+    Prefix of the chunk vector sidecar of a bible.db.
+
+    The matrix is stored as `<prefix>.npy`, so the API can memory-map it, and
+    its row ids, content hashes and model as `<prefix>.json`.
+    """
+    return os.path.splitext(db_path)[0] + ".chunk_vectors"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def load_chunk_vectors(prefix: str) -> tuple[dict | None, np.ndarray | None]:
+    if not (os.path.exists(prefix + ".json") and os.path.exists(prefix + ".npy")):
+        return None, None
+    with open(prefix + ".json") as f:
+        meta = json.load(f)
+    return meta, np.load(prefix + ".npy", mmap_mode="r")
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def build_chunk_vectors(
+    db_path: str,
+    setting: RAGSettings | None = None,
+    embed_model: BaseEmbedding | None = None,
+    prefix: str | None = None,
+) -> dict:
+    """
+    Embed the content of every `text_chunks` row into the sidecar.
+
+    Rows are L2-normalized so the API scores them with a dot product. Chunks
+    whose content is unchanged since the last build, by hash, keep their
+    vectors, so a rebuild only embeds new and edited chunks.
+    """
+    setting = setting or RAGSettings()
+    embed_model = embed_model or LocalEmbedding.set(setting)
+    model_name = setting.ingestion.embed_llm
+    dtype = np.dtype(setting.ingestion.embed_dtype)
+    prefix = prefix or vectors_path(db_path)
+
+    previous: dict[str, int] = {}
+    meta, matrix = load_chunk_vectors(prefix)
+    if meta is not None and meta["embed_model"] == model_name:
+        previous = {h: i for i, h in enumerate(meta["hashes"])}
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    total = conn.execute("SELECT COUNT(*) FROM text_chunks").fetchone()[0]
+    cursor = conn.execute("SELECT rowid, content FROM text_chunks ORDER BY rowid")
+    rowids, hashes, blocks = [], [], []
+    num_embedded = 0
+    with tqdm(total=total, desc="Embedding chunks") as progress:
+        while True:
+            rows = cursor.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+            batch_hashes = [content_hash(content or "") for _, content in rows]
+            missing = [i for i, h in enumerate(batch_hashes) if h not in previous]
+            embedded = {}
+            if missing:
+                embeddings = embed_model.get_text_embedding_batch(
+                    [rows[i][1] or "" for i in missing]
+                )
+                embeddings = _normalize(np.asarray(embeddings, dtype=np.float32))
+                embedded = dict(zip(missing, embeddings))
+                num_embedded += len(missing)
+            blocks.append(
+                np.stack(
+                    [
+                        embedded[i] if i in embedded else matrix[previous[h]]
+                        for i, h in enumerate(batch_hashes)
+                    ]
+                ).astype(dtype)
+            )
+            rowids += [rowid for rowid, _ in rows]
+            hashes += batch_hashes
+            progress.update(len(rows))
+    conn.close()
+
+    dim = blocks[0].shape[1] if blocks else 0
+    vectors = np.concatenate(blocks) if blocks else np.zeros((0, dim), dtype=dtype)
+    # Write next to the old files and swap them in, so readers never see a
+    # half-written sidecar; the JSON goes last and marks the build complete
+    np.save(prefix + ".tmp.npy", vectors)
+    os.replace(prefix + ".tmp.npy", prefix + ".npy")
+    with open(prefix + ".json.tmp", "w") as f:
+        json.dump(
+            {
+                "embed_model": model_name,
+                "dim": dim,
+                "dtype": dtype.name,
+                "rowids": rowids,
+                "hashes": hashes,
+            },
+            f,
+        )
+    os.replace(prefix + ".json.tmp", prefix + ".json")
+    return {"chunks": len(rowids), "embedded": num_embedded, "path": prefix + ".npy"}
@@ -1,29 +1,59 @@
 import asyncio
+import hashlib
 import json
 import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 from tqdm.asyncio import tqdm_asyncio
 from llama_index.core import VectorStoreIndex, Settings
-from llama_index.core.retrievers import VectorIndexRetriever
+from llama_index.core.retrievers import BaseRetriever, VectorIndexRetriever
 from llama_index.retrievers.bm25 import BM25Retriever
-from llama_index.core.postprocessor import SentenceTransformerRerank
 from llama_index.core.evaluation import (
-    RetrieverEvaluator,
     FaithfulnessEvaluator,
     AnswerRelevancyEvaluator,
     ContextRelevancyEvaluator,
 )
 from llama_index.core.evaluation import EmbeddingQAFinetuneDataset
-from llama_index.core.storage.docstore import DocumentStore
-from ..core.engine import LocalChatEngine, LocalRetriever
+from llama_index.core.evaluation.retrieval.metrics import resolve_metrics
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+from ..core.engine import LocalChatEngine, LocalRetriever, get_rerank_model
+from ..core.embedding import LocalEmbedding
 from ..core.model import LocalRAGModel
+from ..core.vector_store import NumpyVectorStore
 from ..setting import RAGSettings
 from ..ollama import is_port_open, run_ollama_server
+from .docstore import load_docstore, save_embeddings
+from .concurrency import AdaptiveLimiter, JsonlCheckpoint, call_with_backoff
+from .sweep import ChunkingSweep
 
 load_dotenv()
 
 
+class TopKRetriever(BaseRetriever):
+    """Keeps the first `top_k` results of a retriever with a larger top-k."""
+
+    def __init__(self, retriever: BaseRetriever, top_k: int) -> None:
+        super().__init__()
+        self._retriever = retriever
+        self._top_k = top_k
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self._retriever.retrieve(query_bundle)[: self._top_k]
+
+
+def file_hash(*paths: str) -> str:
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:12]
+
+
 class RAGPipelineEvaluator:
     def __init__(
         self,
@@ -34,6 +64,9 @@ class RAGPipelineEvaluator:
         docstore_path: str = "val_dataset/docstore.json",
     ) -> None:
         self._setting = RAGSettings()
+        self._llm_name = llm
+        # Checkpoints are only resumed over the same questions and nodes
+        self.dataset_hash = file_hash(dataset_path, docstore_path)
         if llm not in ["gpt-3.5-turbo", "gpt-4", "gpt-4o", "gpt-4-turbo"]:
             print("Pulling LLM model")
             LocalRAGModel.pull(host=host, model_name=llm)
@@ -42,65 +75,57 @@ class RAGPipelineEvaluator:
         self._teacher = LocalRAGModel.set(model_name=teacher, host=host)
         self._engine = LocalChatEngine(host=host)
         Settings.llm = self._llm
-        # Settings.embed_model = LocalEmbedding.set()
 
         # dataset
-        docstore = DocumentStore.from_persist_path(docstore_path)
-        nodes = list(docstore.docs.values())
-        self._index = VectorStoreIndex(nodes=nodes)
+        nodes, embeddings, embed_model = load_docstore(docstore_path)
+        # Queries must be embedded by the model that embedded the nodes
+        if embed_model is not None:
+            self._setting.ingestion.embed_llm = embed_model
+            Settings.embed_model = LocalEmbedding.set(self._setting)
+        if embeddings is None:
+            print("No stored embeddings, embedding nodes")
+            embeddings = np.asarray(
+                Settings.embed_model.get_text_embedding_batch(
+                    [n.get_content(metadata_mode=MetadataMode.EMBED) for n in nodes],
+                    show_progress=True,
+                ),
+                dtype=np.float32,
+            )
+            save_embeddings(
+                docstore_path, [n.node_id for n in nodes], embeddings, embed_model
+            )
+        self._index = VectorStoreIndex.from_vector_store(
+            NumpyVectorStore(blocks=[(nodes, embeddings)])
+        )
         self._dataset = EmbeddingQAFinetuneDataset.from_json(dataset_path)
         self._top_k = self._setting.retriever.similarity_top_k
         self._top_k_rerank = self._setting.retriever.top_k_rerank
 
+        # One vector index and one BM25 index at the larger top-k are shared by
+        # every configuration; smaller top-k results are a prefix of them.
+        vector_retriever = VectorIndexRetriever(
+            index=self._index, similarity_top_k=self._top_k, verbose=True
+        )
+        bm25_retriever = BM25Retriever.from_defaults(
+            nodes=nodes, similarity_top_k=self._top_k, verbose=True
+        )
+        rerank = get_rerank_model(self._setting)
         self._retriever = {
-            "base": VectorIndexRetriever(
-                index=self._index, similarity_top_k=self._top_k_rerank, verbose=True
-            ),
-            "bm25": BM25Retriever.from_defaults(
-                index=self._index, similarity_top_k=self._top_k_rerank, verbose=True
-            ),
-            "base_rerank": VectorIndexRetriever(
-                index=self._index, similarity_top_k=self._top_k, verbose=True
-            ),
-            "bm25_rerank": BM25Retriever.from_defaults(
-                index=self._index, similarity_top_k=self._top_k, verbose=True
-            ),
-            "router": LocalRetriever(host=host).get_retrievers(
-                llm=self._llm, nodes=nodes
-            ),
-        }
-
-        self._retriever_evaluator = {
-            "base": RetrieverEvaluator.from_metric_names(
-                ["mrr", "hit_rate"], retriever=self._retriever["base"]
-            ),
-            "bm25": RetrieverEvaluator.from_metric_names(
-                ["mrr", "hit_rate"], retriever=self._retriever["bm25"]
-            ),
-            "base_rerank": RetrieverEvaluator.from_metric_names(
-                ["mrr", "hit_rate"],
-                retriever=self._retriever["base_rerank"],
-                node_postprocessors=[
-                    SentenceTransformerRerank(
-                        top_n=self._top_k_rerank,
-                        model=self._setting.retriever.rerank_llm,
-                    )
-                ],
-            ),
-            "bm25_rerank": RetrieverEvaluator.from_metric_names(
-                ["mrr", "hit_rate"],
-                retriever=self._retriever["bm25_rerank"],
-                node_postprocessors=[
-                    SentenceTransformerRerank(
-                        top_n=self._top_k_rerank,
-                        model=self._setting.retriever.rerank_llm,
-                    )
-                ],
-            ),
-            "router": RetrieverEvaluator.from_metric_names(
-                ["mrr", "hit_rate"], retriever=self._retriever["router"]
+            "base": (TopKRetriever(vector_retriever, self._top_k_rerank), []),
+            "bm25": (TopKRetriever(bm25_retriever, self._top_k_rerank), []),
+            "base_rerank": (vector_retriever, [rerank]),
+            "bm25_rerank": (bm25_retriever, [rerank]),
+            "router": (
+                LocalRetriever(setting=self._setting, host=host).get_retrievers(
+                    llm=self._llm,
+                    nodes=nodes,
+                    vector_index=self._index,
+                    bm25_retriever=bm25_retriever,
+                ),
+                [],
             ),
         }
+        self._metrics = [metric() for metric in resolve_metrics(["mrr", "hit_rate"])]
 
         self._generator_evaluator = {
             "faithfulness": FaithfulnessEvaluator(
@@ -112,99 +137,174 @@ class RAGPipelineEvaluator:
             "context_relevancy": ContextRelevancyEvaluator(llm=self._teacher),
         }
 
-    async def eval_retriever(self):
+    async def _embed_queries(self) -> dict[str, QueryBundle]:
+        # Embed every query once, all retriever configurations reuse it
+        query_ids = list(self._dataset.queries.keys())
+        embeddings = await tqdm_asyncio.gather(
+            *[
+                Settings.embed_model.aget_query_embedding(self._dataset.queries[qid])
+                for qid in query_ids
+            ],
+            desc="embedding queries",
+        )
+        return {
+            qid: QueryBundle(self._dataset.queries[qid], embedding=embedding)
+            for qid, embedding in zip(query_ids, embeddings)
+        }
+
+    def _eval_retriever_query(self, name, query_bundle, expected_ids):
+        retriever, postprocessors = self._retriever[name]
+        start = time.perf_counter()
+        nodes = retriever.retrieve(query_bundle)
+        for postprocessor in postprocessors:
+            nodes = postprocessor.postprocess_nodes(nodes, query_bundle)
+        latency = time.perf_counter() - start
+        retrieved_ids = [n.node.node_id for n in nodes]
+        metrics = {
+            metric.metric_name: metric.compute(
+                query_bundle.query_str, expected_ids, retrieved_ids
+            ).score
+            for metric in self._metrics
+        }
+        return metrics, latency
+
+    async def eval_retriever(self, workers: int = 4):
+        query_bundles = await self._embed_queries()
+        loop = asyncio.get_running_loop()
+        # Retrieval and reranking are blocking calls, run every
+        # (configuration, query) pair on a shared thread pool
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            tasks = {
+                name: [
+                    loop.run_in_executor(
+                        executor,
+                        self._eval_retriever_query,
+                        name,
+                        query_bundle,
+                        self._dataset.relevant_docs[qid],
+                    )
+                    for qid, query_bundle in query_bundles.items()
+                ]
+                for name in self._retriever.keys()
+            }
+            results = await tqdm_asyncio.gather(
+                *[t for name_tasks in tasks.values() for t in name_tasks],
+                desc="retrieving",
+            )
+
         result = {}
-        for retriever_name in self._retriever_evaluator.keys():
-            print(f"Running {retriever_name} retriever")
-            result[retriever_name] = self._process_retriever_result(
-                retriever_name,
-                await self._retriever_evaluator[retriever_name].aevaluate_dataset(
-                    self._dataset, show_progress=True
-                ),
+        for i, name in enumerate(tasks.keys()):
+            n = len(query_bundles)
+            result[name] = self._process_retriever_result(
+                name, results[i * n : (i + 1) * n]
             )
         return result
 
-    async def _query_with_delay(self, query_engine, q, delay):
-        await asyncio.sleep(delay)
-        return await query_engine.aquery(q)
+    async def _eval_query(self, query_engine, limiter, query_id):
+        query = self._dataset.queries[query_id]
+        doc_id = self._dataset.relevant_docs[query_id][0]
+        context = self._dataset.corpus[doc_id]
 
-    async def eval_generator(self):
-        queries = list(self._dataset.queries.values())[:3]
-        context = list(self._dataset.corpus.values())[:3]
-        query_engine = self._index.as_query_engine(
-            llm=self._llm,
+        response = await call_with_backoff(limiter, lambda: query_engine.aquery(query))
+        response = str(response)
+
+        faithfulness, answer_relevancy, context_relevancy = await asyncio.gather(
+            call_with_backoff(
+                limiter,
+                lambda: self._generator_evaluator["faithfulness"].aevaluate(
+                    response=response, contexts=[context]
+                ),
+            ),
+            call_with_backoff(
+                limiter,
+                lambda: self._generator_evaluator["answer_relevancy"].aevaluate(
+                    query=query, response=response
+                ),
+            ),
+            call_with_backoff(
+                limiter,
+                lambda: self._generator_evaluator["context_relevancy"].aevaluate(
+                    query=query, contexts=[context]
+                ),
+            ),
         )
-        response = []
-        for i in range(0, len(queries), 10):
-            print(f"Running queries {i} to {i+10}")
-            task = [query_engine.aquery(q) for q in queries[i : i + 10]]
-            response += await tqdm_asyncio.gather(*task, desc="querying")
-            await asyncio.sleep(5)
-
-        response = [str(r) for r in response]
-
-        faithful_task = []
-        answer_relevancy_task = []
-        context_relevancy_task = []
-        for q, r, c in zip(queries, response, context):
-            faithful_task.append(
-                self._generator_evaluator["faithfulness"].aevaluate(
-                    response=r, contexts=[c]
-                )
-            )
-            answer_relevancy_task.append(
-                self._generator_evaluator["answer_relevancy"].aevaluate(
-                    query=q, response=r
-                )
-            )
-            context_relevancy_task.append(
-                self._generator_evaluator["context_relevancy"].aevaluate(
-                    query=q, contexts=[c]
-                )
-            )
+        return {
+            "id": query_id,
+            "response": response,
+            "faithfulness": json.loads(faithfulness.json()),
+            "answer_relevancy": json.loads(answer_relevancy.json()),
+            "context_relevancy": json.loads(context_relevancy.json()),
+        }
 
-        faithful_result = await tqdm_asyncio.gather(*faithful_task, desc="faithfulness")
-        answer_relevancy_result = await tqdm_asyncio.gather(
-            *answer_relevancy_task, desc="answer_relevancy"
+    async def eval_generator(
+        self,
+        max_concurrency: int = 8,
+        checkpoint_path: str | None = None,
+        limit: int | None = None,
+    ):
+        query_ids = list(self._dataset.queries.keys())[:limit]
+        checkpoint = JsonlCheckpoint(
+            checkpoint_path,
+            header={"llm": self._llm_name, "dataset": self.dataset_hash},
         )
-        context_relevancy_result = await tqdm_asyncio.gather(
-            *context_relevancy_task, desc="context_relevancy"
+        pending = [qid for qid in query_ids if qid not in checkpoint]
+        if len(pending) < len(query_ids):
+            print(f"Resuming: {len(query_ids) - len(pending)} queries already done")
+
+        query_engine = self._index.as_query_engine(
+            llm=self._llm,
         )
+        # Generation and judge calls share one limit, so a query's judges
+        # start as soon as its answer is ready instead of waiting for a wave
+        limiter = AdaptiveLimiter(max_concurrency=max_concurrency)
+
+        # Failed queries aren't checkpointed, so a resumed run retries them
+        failed = {}
+
+        async def run(query_id):
+            try:
+                checkpoint.add(await self._eval_query(query_engine, limiter, query_id))
+            except Exception as e:
+                print(f"Query {query_id} failed: {e}")
+                failed[query_id] = str(e)
 
+        await tqdm_asyncio.gather(*[run(qid) for qid in pending], desc="evaluating")
+        if failed:
+            print(f"{len(failed)} of {len(query_ids)} queries failed")
+
+        records = [checkpoint.records[qid] for qid in query_ids if qid in checkpoint]
         return {
-            "faithfulness": self._process_generator_result(
-                "faithfulness", faithful_result
-            ),
-            "answer_relevancy": self._process_generator_result(
-                "answer_relevancy", answer_relevancy_result
-            ),
-            "context_relevancy": self._process_generator_result(
-                "context_relevancy", context_relevancy_result
-            ),
+            name: {
+                "generator": name,
+                "result": [r[name] for r in records],
+                "failed": failed,
+            }
+            for name in self._generator_evaluator.keys()
         }
 
     def _process_retriever_result(self, name, eval_results):
         """Display results from evaluate."""
 
-        metric_dicts = []
-        for eval_result in eval_results:
-            metric_dict = eval_result.metric_vals_dict
-            metric_dicts.append(metric_dict)
-
-        full_df = pd.DataFrame(metric_dicts)
+        full_df = pd.DataFrame([metrics for metrics, _ in eval_results])
+        latencies = np.asarray([latency for _, latency in eval_results]) * 1000
 
         hit_rate = full_df["hit_rate"].mean()
         mrr = full_df["mrr"].mean()
-        metrics = {"retrievers": name, "hit_rate": hit_rate, "mrr": mrr}
+        metrics = {
+            "retrievers": name,
+            "hit_rate": hit_rate,
+            "mrr": mrr,
+            "latency_ms": {
+                "mean": round(float(latencies.mean()), 3),
+                "p50": round(float(np.percentile(latencies, 50)), 3),
+                "p95": round(float(np.percentile(latencies, 95)), 3),
+                "p99": round(float(np.percentile(latencies, 99)), 3),
+                "max": round(float(latencies.max()), 3),
+            },
+        }
 
         return metrics
 
-    def _process_generator_result(self, name, eval_results):
-        result = []
-        for r in eval_results:
-            result.append(json.loads(r.json()))
-        return {"generator": name, "result": result}
-
 
 if __name__ == "__main__":
     # OLLAMA SERVER
@@ -213,8 +313,8 @@ if __name__ == "__main__":
         "--type",
         type=str,
         default="retriever",
-        choices=["retriever", "generator"],
-        help="Set type to retriever or generator",
+        choices=["retriever", "generator", "sweep"],
+        help="Set type to retriever, generator or chunking sweep",
     )
     parser.add_argument(
         "--llm",
@@ -246,38 +346,135 @@ if __name__ == "__main__":
         default="harry_potter_dataset/docstore.json",
         help="Set docstore path",
     )
-    args = parser.parse_args()
-    if args.host != "host.docker.internal":
-        port_number = 11434
-        if not is_port_open(port_number) and args.llm not in [
-            "gpt-3.5-turbo",
-            "gpt-4",
-            "gpt-4o",
-            "gpt-4-turbo",
-        ]:
-            run_ollama_server()
-    evaluator = RAGPipelineEvaluator(
-        llm=args.llm,
-        teacher=args.teacher,
-        host=args.host,
-        dataset_path=args.dataset,
-        docstore_path=args.docstore,
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Set maximum number of concurrent LLM calls in generator eval",
     )
+    parser.add_argument(
+        "--checkpoint",
+        type=str,
+        default=None,
+        help="Set JSONL checkpoint path to resume generator eval",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Set maximum number of queries in generator eval",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Set number of threads running retriever eval",
+    )
+    parser.add_argument(
+        "--input-files",
+        type=str,
+        nargs="+",
+        default=[],
+        help="Set source documents of the dataset for chunking sweep",
+    )
+    parser.add_argument(
+        "--chunk-sizes",
+        type=int,
+        nargs="+",
+        default=[256, 512, 1024],
+        help="Set chunk sizes for chunking sweep",
+    )
+    parser.add_argument(
+        "--chunk-overlaps",
+        type=int,
+        nargs="+",
+        default=[0, 32, 64],
+        help="Set chunk overlaps for chunking sweep",
+    )
+    parser.add_argument(
+        "--top-ks",
+        type=int,
+        nargs="+",
+        default=[10, 20],
+        help="Set similarity top k values for chunking sweep",
+    )
+    parser.add_argument(
+        "--top-k-reranks",
+        type=int,
+        nargs="+",
+        default=[3, 6],
+        help="Set rerank top k values for chunking sweep",
+    )
+    parser.add_argument(
+        "--no-rerank",
+        action="store_true",
+        help="Truncate instead of rerank in chunking sweep",
+    )
+    parser.add_argument(
+        "--embed-cache",
+        type=str,
+        default="sweep_embed_cache.npz",
+        help="Set chunk embedding cache path for chunking sweep",
+    )
+    args = parser.parse_args()
 
-    async def eval_retriever():
-        retriever_result = await evaluator.eval_retriever()
-        print(retriever_result)
-        # save results
-        with open("retriever_result.json", "w") as f:
-            json.dump(retriever_result, f)
-
-    async def eval_generator():
-        generator_result = await evaluator.eval_generator()
+    def eval_sweep():
+        # Sweeps only embed and rerank, no LLM server is needed
+        sweep = ChunkingSweep(
+            input_files=args.input_files,
+            dataset_path=args.dataset,
+            embed_cache_path=args.embed_cache,
+            rerank=not args.no_rerank,
+        )
+        sweep_result = sweep.run(
+            chunk_sizes=args.chunk_sizes,
+            chunk_overlaps=args.chunk_overlaps,
+            top_ks=args.top_ks,
+            top_k_reranks=args.top_k_reranks,
+        )
         # save results
-        with open(f"generator_result_{args.llm}.json", "w") as f:
-            json.dump(generator_result, f)
+        with open("sweep_result.json", "w") as f:
+            json.dump(sweep_result, f)
 
-    if args.type == "retriever":
-        asyncio.run(eval_retriever())
+    if args.type == "sweep":
+        eval_sweep()
     else:
-        asyncio.run(eval_generator())
+        if args.host != "host.docker.internal":
+            port_number = 11434
+            if not is_port_open(port_number) and args.llm not in [
+                "gpt-3.5-turbo",
+                "gpt-4",
+                "gpt-4o",
+                "gpt-4-turbo",
+            ]:
+                run_ollama_server()
+        evaluator = RAGPipelineEvaluator(
+            llm=args.llm,
+            teacher=args.teacher,
+            host=args.host,
+            dataset_path=args.dataset,
+            docstore_path=args.docstore,
+        )
+
+        async def eval_retriever():
+            retriever_result = await evaluator.eval_retriever(workers=args.workers)
+            print(retriever_result)
+            # save results
+            with open("retriever_result.json", "w") as f:
+                json.dump(retriever_result, f)
+
+        async def eval_generator():
+            generator_result = await evaluator.eval_generator(
+                max_concurrency=args.concurrency,
+                checkpoint_path=args.checkpoint
+                or f"generator_checkpoint_{args.llm}_{evaluator.dataset_hash}.jsonl",
+                limit=args.limit,
+            )
+            # save results
+            with open(f"generator_result_{args.llm}.json", "w") as f:
+                json.dump(generator_result, f)
+
+        if args.type == "retriever":
+            asyncio.run(eval_retriever())
+        else:
+            asyncio.run(eval_generator())
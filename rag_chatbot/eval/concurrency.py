@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+import random
+from typing import Any, Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit for LLM calls that backs off when calls fail.
+
+    The limit is halved on every error and grows back by one after
+    `recover_after` consecutive successes, up to `max_concurrency`.
+    """
+
+    def __init__(self, max_concurrency: int = 8, recover_after: int = 10) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self._recover_after = recover_after
+        self._active = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self) -> "AdaptiveLimiter":
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        async with self._condition:
+            self._active -= 1
+            if exc_type is None:
+                self._successes += 1
+                if (
+                    self._successes >= self._recover_after
+                    and self.limit < self.max_concurrency
+                ):
+                    self.limit += 1
+                    self._successes = 0
+            else:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+            self._condition.notify_all()
+
+
+async def call_with_backoff(
+    limiter: AdaptiveLimiter,
+    fn: Callable[[], Awaitable[T]],
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+) -> T:
+    """Run `fn` under the limiter, retrying with jittered exponential backoff."""
+    for attempt in range(max_retries + 1):
+        try:
+            async with limiter:
+                return await fn()
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = min(max_delay, base_delay * 2**attempt) * random.uniform(0.5, 1.5)
+            print(f"Call failed ({e}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+class JsonlCheckpoint:
+    """
+    Append-only JSONL file of finished records, keyed by `key`.
+
+    With a `header`, e.g. the model and a hash of the dataset, the file
+    starts with it and is only resumed by a run with the same header.
+    """
+
+    HEADER_KEY = "__header__"
+
+    def __init__(
+        self, path: str | None, key: str = "id", header: dict | None = None
+    ) -> None:
+        self._path = path
+        self._key = key
+        self._header = header
+        self.records: dict[str, Any] = {}
+        if path and os.path.exists(path):
+            truncated = False
+            found_header = None
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A run killed mid-write leaves a partial last line
+                        truncated = True
+                        continue
+                    if self.HEADER_KEY in record:
+                        found_header = record[self.HEADER_KEY]
+                        continue
+                    self.records[record[key]] = record
+            if header is not None and found_header != header and self.records:
+                raise ValueError(
+                    f"Checkpoint {path} was written by another run "
+                    f"({found_header}, not {header}), remove it or use another path"
+                )
+            if truncated or found_header != header:
+                self._rewrite()
+        elif path and header is not None:
+            self._rewrite()
+
+    def _rewrite(self) -> None:
+        with open(self._path, "w") as f:
+            if self._header is not None:
+                f.write(json.dumps({self.HEADER_KEY: self._header}) + "\n")
+            for record in self.records.values():
+                f.write(json.dumps(record) + "\n")
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.records
+
+    def add(self, record: dict) -> None:
+        self.records[record[self._key]] = record
+        if self._path:
+            with open(self._path, "a") as f:
+                f.write(json.dumps(record) + "\n")
@@ -0,0 +1,76 @@
+import os
+from typing import List, Tuple
+import numpy as np
+from llama_index.core.schema import BaseNode
+from llama_index.core.storage.docstore import DocumentStore
+
+
+def embeddings_path(docstore_path: str) -> str:
+    """Path of the embedding sidecar stored next to a docstore JSON file."""
+    return os.path.splitext(docstore_path)[0] + ".embeddings.npz"
+
+
+def save_embeddings(
+    docstore_path: str,
+    node_ids: List[str],
+    embeddings: np.ndarray,
+    embed_model: str | None = None,
+) -> None:
+    np.savez(
+        embeddings_path(docstore_path),
+        node_ids=np.asarray(node_ids),
+        embeddings=np.asarray(embeddings),
+        embed_model=np.asarray(embed_model or ""),
+    )
+
+
+def load_embeddings(
+    docstore_path: str, nodes: List[BaseNode]
+) -> Tuple[np.ndarray | None, str | None]:
+    """
+    Embeddings of `nodes` (row i is node i) and the model that produced them.
+
+    Falls back to embeddings stored inside the nodes by older docstores, and
+    returns None when some node has no embedding.
+    """
+    path = embeddings_path(docstore_path)
+    if os.path.exists(path):
+        with np.load(path) as data:
+            row = {node_id: i for i, node_id in enumerate(data["node_ids"].tolist())}
+            embed_model = str(data["embed_model"]) or None
+            if all(node.node_id in row for node in nodes):
+                rows = [row[node.node_id] for node in nodes]
+                return data["embeddings"][rows], embed_model
+    if nodes and all(node.embedding is not None for node in nodes):
+        embeddings = np.asarray([node.embedding for node in nodes], dtype=np.float32)
+        for node in nodes:
+            node.embedding = None
+        return embeddings, None
+    return None, None
+
+
+def save_docstore(
+    nodes: List[BaseNode],
+    docstore_path: str,
+    embeddings: np.ndarray | None = None,
+    embed_model: str | None = None,
+) -> None:
+    """Persist nodes as JSON without their embeddings, which go to the sidecar."""
+    for node in nodes:
+        node.embedding = None
+    docstore = DocumentStore()
+    docstore.add_documents(nodes)
+    docstore.persist(persist_path=docstore_path)
+    if embeddings is not None:
+        save_embeddings(
+            docstore_path, [node.node_id for node in nodes], embeddings, embed_model
+        )
+
+
+def load_docstore(
+    docstore_path: str,
+) -> Tuple[List[BaseNode], np.ndarray | None, str | None]:
+    docstore = DocumentStore.from_persist_path(docstore_path)
+    nodes = list(docstore.docs.values())
+    embeddings, embed_model = load_embeddings(docstore_path, nodes)
+    return nodes, embeddings, embed_model
@@ -1,17 +1,19 @@
+import asyncio
 import random
 import re
 import os
 import uuid
 from typing import List
-from tqdm import tqdm
+from tqdm.asyncio import tqdm_asyncio
 from llama_index.core.llms.utils import LLM
 from llama_index.core.schema import MetadataMode, TextNode
-from llama_index.core.storage.docstore import DocumentStore
 from llama_index.core.evaluation import EmbeddingQAFinetuneDataset
 from ..core.model import LocalRAGModel
 from ..core.embedding import LocalEmbedding
 from ..core.ingestion import LocalDataIngestion
 from ..setting import RAGSettings
+from .concurrency import AdaptiveLimiter, JsonlCheckpoint, call_with_backoff
+from .docstore import load_docstore, save_docstore
 
 
 DEFAULT_QA_GENERATE_PROMPT_TMPL = """\
@@ -32,34 +34,59 @@ Only provide the questions, not the answers.\"
 """
 
 
-# generate queries as a convenience function
-def generate_question_context_pairs(
+def _parse_questions(response: str) -> List[str]:
+    result = response.strip().split("\n")
+    questions = [re.sub(r"^\d+[\).\s]", "", question).strip() for question in result]
+    return [question for question in questions if len(question) > 0]
+
+
+async def agenerate_question_context_pairs(
     nodes: List[TextNode],
     llm: LLM,
     qa_generate_prompt_tmpl: str = DEFAULT_QA_GENERATE_PROMPT_TMPL,
     num_questions_per_chunk: int = 2,
+    max_concurrency: int = 8,
+    checkpoint_path: str | None = None,
 ) -> EmbeddingQAFinetuneDataset:
-    """Generate examples given a set of nodes."""
+    """
+    Generate examples given a set of nodes.
+
+    Questions of each finished node are appended to `checkpoint_path`, nodes
+    already in the checkpoint are not sent to the LLM again.
+    """
     node_dict = {
         node.node_id: node.get_content(metadata_mode=MetadataMode.NONE)
         for node in nodes
     }
+    checkpoint = JsonlCheckpoint(checkpoint_path)
+    limiter = AdaptiveLimiter(max_concurrency=max_concurrency)
 
-    queries = {}
-    relevant_docs = {}
-    for node_id, text in tqdm(node_dict.items()):
+    async def generate(node_id: str, text: str):
         query = qa_generate_prompt_tmpl.format(
             context_str=text, num_questions_per_chunk=num_questions_per_chunk
         )
-        response = llm.complete(query)
-
-        result = str(response).strip().split("\n")
-        questions = [
-            re.sub(r"^\d+[\).\s]", "", question).strip() for question in result
-        ]
-        questions = [question for question in questions if len(question) > 0]
+        try:
+            response = await call_with_backoff(limiter, lambda: llm.acomplete(query))
+        except Exception as e:
+            print(f"Node {node_id} failed: {e}")
+            return
+        checkpoint.add({"id": node_id, "questions": _parse_questions(str(response))})
+
+    await tqdm_asyncio.gather(
+        *[
+            generate(node_id, text)
+            for node_id, text in node_dict.items()
+            if node_id not in checkpoint
+        ],
+        desc="Generating questions",
+    )
 
-        for question in questions:
+    queries = {}
+    relevant_docs = {}
+    for node_id in node_dict.keys():
+        if node_id not in checkpoint:
+            continue
+        for question in checkpoint.records[node_id]["questions"]:
             question_id = str(uuid.uuid4())
             queries[question_id] = question
             relevant_docs[question_id] = [node_id]
@@ -70,6 +97,28 @@ def generate_question_context_pairs(
     )
 
 
+# generate queries as a convenience function
+def generate_question_context_pairs(
+    nodes: List[TextNode],
+    llm: LLM,
+    qa_generate_prompt_tmpl: str = DEFAULT_QA_GENERATE_PROMPT_TMPL,
+    num_questions_per_chunk: int = 2,
+    max_concurrency: int = 8,
+    checkpoint_path: str | None = None,
+) -> EmbeddingQAFinetuneDataset:
+    """Generate examples given a set of nodes."""
+    return asyncio.run(
+        agenerate_question_context_pairs(
+            nodes,
+            llm,
+            qa_generate_prompt_tmpl=qa_generate_prompt_tmpl,
+            num_questions_per_chunk=num_questions_per_chunk,
+            max_concurrency=max_concurrency,
+            checkpoint_path=checkpoint_path,
+        )
+    )
+
+
 class QAGenerator:
     def __init__(
         self,
@@ -79,6 +128,7 @@ class QAGenerator:
     ) -> None:
         setting = RAGSettings()
         setting.ingestion.embed_llm = embed_model or setting.ingestion.embed_llm
+        self._setting = setting
         self._embed_model = LocalEmbedding.set(setting)
         self._llm = LocalRAGModel.set(model_name=llm or setting.ollama.llm, host=host)
         self._ingestion = LocalDataIngestion()
@@ -89,25 +139,39 @@ class QAGenerator:
         output_dir: str = "val_dataset",
         max_nodes: int = 100,
         num_questions_per_chunk=2,
+        max_concurrency: int = 8,
+        seed: int = 0,
     ) -> None:
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
-        if os.path.exists(os.path.join(output_dir, "docstore.json")):
+        docstore_path = os.path.join(output_dir, "docstore.json")
+        if os.path.exists(docstore_path):
             print("Docstore already exist! Skip ingestion.")
-
-        nodes = self._ingestion.store_nodes(input_files, embed_nodes=True)
-        random.shuffle(nodes)
+            nodes, _, _ = load_docstore(docstore_path)
+        else:
+            self._ingestion.store_nodes(
+                input_files, embed_nodes=True, embed_model=self._embed_model
+            )
+            nodes = list(self._ingestion.get_ingested_nodes())
+            # save nodes, with their embeddings in a NumPy sidecar, before
+            # generating so a resumed run doesn't embed them again
+            save_docstore(
+                nodes,
+                docstore_path,
+                embeddings=self._ingestion.get_ingested_embeddings(),
+                embed_model=self._setting.ingestion.embed_llm,
+            )
+
+        # A fixed seed picks the same nodes when an interrupted run resumes
+        sample = random.Random(seed).sample(nodes, min(max_nodes, len(nodes)))
         dataset = generate_question_context_pairs(
-            nodes=nodes[:max_nodes],
+            nodes=sample,
             llm=self._llm,
             num_questions_per_chunk=num_questions_per_chunk,
+            max_concurrency=max_concurrency,
+            checkpoint_path=os.path.join(output_dir, "questions.jsonl"),
         )
 
         # save dataset
         dataset.save_json(os.path.join(output_dir, "dataset.json"))
-
-        # save nodes
-        docstore = DocumentStore()
-        docstore.add_documents(nodes)
-        docstore.persist(persist_path=os.path.join(output_dir, "docstore.json"))
@@ -0,0 +1,309 @@
+import hashlib
+import itertools
+import os
+import time
+from typing import List
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+from llama_index.core import Settings, VectorStoreIndex
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.evaluation import EmbeddingQAFinetuneDataset
+from llama_index.core.evaluation.retrieval.metrics import resolve_metrics
+from llama_index.core.retrievers import VectorIndexRetriever
+from llama_index.core.schema import BaseNode, MetadataMode, QueryBundle
+from ..core.embedding import LocalEmbedding
+from ..core.engine import get_rerank_model
+from ..core.ingestion import LocalDataIngestion
+from ..core.vector_store import NumpyVectorStore
+from ..setting import RAGSettings
+
+# A chunk counts as relevant if it covers this much of the shorter of
+# (chunk, original context)
+MIN_OVERLAP = 0.5
+
+# Chunks embedded to measure the embedding speed when all came from the cache
+RATE_SAMPLE_SIZE = 32
+
+
+class EmbeddingCache:
+    """
+    Chunk embeddings keyed by a hash of the embedded text.
+
+    Also measures the embedding speed, per character embedded, so the
+    uncached cost of a chunking can be estimated whatever the cache holds.
+    """
+
+    def __init__(self, path: str | None = None, model_name: str = "") -> None:
+        self._path = path
+        self._model_name = model_name
+        self._rows: dict[str, np.ndarray] = {}
+        self._embed_s = 0.0
+        self._embed_chars = 0
+        if path and os.path.exists(path):
+            with np.load(path) as data:
+                if str(data["embed_model"]) == model_name:
+                    for key, row in zip(data["keys"].tolist(), data["embeddings"]):
+                        self._rows[key] = row
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def embed(self, texts: List[str]) -> tuple[np.ndarray, int]:
+        """Embeddings of `texts` and the number that had to be computed."""
+        keys = [self._key(text) for text in texts]
+        missing = {key: text for key, text in zip(keys, texts) if key not in self._rows}
+        if missing:
+            embeddings = self._embed(list(missing.values()), show_progress=True)
+            for key, embedding in zip(missing.keys(), embeddings):
+                self._rows[key] = np.asarray(embedding, dtype=np.float32)
+        return np.stack([self._rows[key] for key in keys]), len(missing)
+
+    def _embed(self, texts: List[str], show_progress: bool = False) -> list:
+        start = time.perf_counter()
+        embeddings = Settings.embed_model.get_text_embedding_batch(
+            texts, show_progress=show_progress
+        )
+        self._embed_s += time.perf_counter() - start
+        self._embed_chars += sum(len(text) for text in texts)
+        return embeddings
+
+    def embed_seconds(self, texts: List[str]) -> float:
+        """Estimated time to embed `texts` with an empty cache."""
+        if not texts:
+            return 0.0
+        if self._embed_chars == 0:
+            self._embed(texts[:RATE_SAMPLE_SIZE])
+        return sum(len(text) for text in texts) * self._embed_s / self._embed_chars
+
+    def save(self) -> None:
+        if not self._path or not self._rows:
+            return
+        np.savez(
+            self._path,
+            keys=np.asarray(list(self._rows.keys())),
+            embeddings=np.stack(list(self._rows.values())),
+            embed_model=np.asarray(self._model_name),
+        )
+
+
+def pareto_front(results: List[dict]) -> None:
+    """Flag results not beaten on every objective by some other result."""
+    maximize = ["hit_rate", "mrr"]
+    minimize = ["ingest_s", "index_mb", "latency_p50_ms"]
+
+    def dominates(a: dict, b: dict) -> bool:
+        no_worse = all(a[k] >= b[k] for k in maximize) and all(
+            a[k] <= b[k] for k in minimize
+        )
+        better = any(a[k] > b[k] for k in maximize) or any(
+            a[k] < b[k] for k in minimize
+        )
+        return no_worse and better
+
+    for result in results:
+        result["pareto"] = not any(dominates(other, result) for other in results)
+
+
+class ChunkingSweep:
+    """
+    Evaluates retrieval over a grid of chunking and top-k settings.
+
+    Dataset queries point at chunks of the chunking they were generated from,
+    so each query's context is located in the source documents and any new
+    chunk overlapping it is counted as relevant.
+    """
+
+    def __init__(
+        self,
+        input_files: List[str],
+        dataset_path: str,
+        setting: RAGSettings | None = None,
+        embed_cache_path: str | None = None,
+        rerank: bool = True,
+        embed_model: BaseEmbedding | None = None,
+    ) -> None:
+        self._setting = setting or RAGSettings()
+        self._rerank = rerank
+        Settings.embed_model = embed_model or LocalEmbedding.set(self._setting)
+        ingestion = LocalDataIngestion(self._setting)
+        self._documents = [ingestion.read_document(f) for f in input_files]
+        self._dataset = EmbeddingQAFinetuneDataset.from_json(dataset_path)
+        self._spans = self._locate_contexts()
+        self._cache = EmbeddingCache(
+            embed_cache_path, self._setting.ingestion.embed_llm
+        )
+        self._metrics = [metric() for metric in resolve_metrics(["mrr", "hit_rate"])]
+        # Query embeddings don't depend on the chunking, embed them once
+        self._query_bundles = {
+            qid: QueryBundle(
+                self._dataset.queries[qid],
+                embedding=Settings.embed_model.get_query_embedding(
+                    self._dataset.queries[qid]
+                ),
+            )
+            for qid in tqdm(self._spans.keys(), desc="Embedding queries")
+        }
+
+    def _find(self, text: str) -> tuple[int, int, int] | None:
+        for doc_idx, document in enumerate(self._documents):
+            start = document.text.find(text)
+            if start >= 0:
+                return doc_idx, start, start + len(text)
+        return None
+
+    def _locate_contexts(self) -> dict[str, tuple[int, int, int]]:
+        spans = {}
+        for qid in self._dataset.queries.keys():
+            context = self._dataset.corpus[self._dataset.relevant_docs[qid][0]]
+            span = self._find(context)
+            if span is not None:
+                spans[qid] = span
+        if len(spans) < len(self._dataset.queries):
+            print(
+                f"Skipping {len(self._dataset.queries) - len(spans)} queries "
+                "whose context is not in the input files"
+            )
+        return spans
+
+    def _node_span(self, node: BaseNode, doc_idx: int) -> tuple[int, int, int]:
+        start = node.start_char_idx
+        if start is None:
+            start = max(self._documents[doc_idx].text.find(node.text), 0)
+        return doc_idx, start, start + len(node.text)
+
+    def _relevant_ids(self, nodes: List[BaseNode]) -> dict[str, List[str]]:
+        doc_index = {doc.doc_id: i for i, doc in enumerate(self._documents)}
+        node_spans = [self._node_span(n, doc_index[n.ref_doc_id]) for n in nodes]
+        relevant = {}
+        for qid, (doc_idx, start, end) in self._spans.items():
+            relevant[qid] = [
+                node.node_id
+                for node, (n_doc, n_start, n_end) in zip(nodes, node_spans)
+                if n_doc == doc_idx
+                and min(end, n_end) - max(start, n_start)
+                >= MIN_OVERLAP * min(end - start, n_end - n_start)
+            ]
+        return relevant
+
+    def _chunk(self, chunk_size: int, chunk_overlap: int) -> List[BaseNode]:
+        setting = self._setting.model_copy(deep=True)
+        setting.ingestion.chunk_size = chunk_size
+        setting.ingestion.chunk_overlap = chunk_overlap
+        return LocalDataIngestion(setting).get_splitter()(self._documents)
+
+    def _score(self, relevant: dict, retrieved: dict) -> dict:
+        scores = {metric.metric_name: [] for metric in self._metrics}
+        for qid, retrieved_ids in retrieved.items():
+            for metric in self._metrics:
+                if not relevant[qid] or not retrieved_ids:
+                    scores[metric.metric_name].append(0.0)
+                    continue
+                scores[metric.metric_name].append(
+                    metric.compute(
+                        self._query_bundles[qid].query_str,
+                        relevant[qid],
+                        retrieved_ids,
+                    ).score
+                )
+        return {name: float(np.mean(values)) for name, values in scores.items()}
+
+    def _eval_chunking(
+        self,
+        chunk_size: int,
+        chunk_overlap: int,
+        top_ks: List[int],
+        top_k_reranks: List[int],
+    ) -> List[dict]:
+        start = time.perf_counter()
+        nodes = self._chunk(chunk_size, chunk_overlap)
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        chunk_s = time.perf_counter() - start
+        embeddings, num_embedded = self._cache.embed(texts)
+        ingest_cached_s = time.perf_counter() - start
+        # The objective is the cost of ingesting from scratch, so it doesn't
+        # depend on which chunkings ran before and filled the cache
+        ingest_s = chunk_s + self._cache.embed_seconds(texts)
+
+        index = VectorStoreIndex.from_vector_store(
+            NumpyVectorStore(blocks=[(nodes, embeddings)])
+        )
+        index_mb = (
+            embeddings.nbytes + sum(len(node.text.encode("utf-8")) for node in nodes)
+        ) / 2**20
+        relevant = self._relevant_ids(nodes)
+
+        results = []
+        for top_k in top_ks:
+            retriever = VectorIndexRetriever(index=index, similarity_top_k=top_k)
+            retrieved = {}
+            for qid, query_bundle in self._query_bundles.items():
+                t = time.perf_counter()
+                retrieved_nodes = retriever.retrieve(query_bundle)
+                retrieved[qid] = (retrieved_nodes, time.perf_counter() - t)
+
+            for top_k_rerank in top_k_reranks:
+                if top_k_rerank > top_k:
+                    continue
+                rerank_setting = self._setting.model_copy(deep=True)
+                rerank_setting.retriever.top_k_rerank = top_k_rerank
+                rerank = get_rerank_model(rerank_setting) if self._rerank else None
+                final_ids = {}
+                latencies = []
+                for qid, (retrieved_nodes, latency) in retrieved.items():
+                    t = time.perf_counter()
+                    if rerank is not None:
+                        final = rerank.postprocess_nodes(
+                            retrieved_nodes, self._query_bundles[qid]
+                        )
+                    else:
+                        final = retrieved_nodes[:top_k_rerank]
+                    latencies.append(latency + time.perf_counter() - t)
+                    final_ids[qid] = [n.node.node_id for n in final]
+                latencies_ms = np.asarray(latencies) * 1000
+                results.append(
+                    {
+                        "chunk_size": chunk_size,
+                        "chunk_overlap": chunk_overlap,
+                        "similarity_top_k": top_k,
+                        "top_k_rerank": top_k_rerank,
+                        **self._score(relevant, final_ids),
+                        "num_chunks": len(nodes),
+                        "num_embedded": num_embedded,
+                        "ingest_s": round(ingest_s, 3),
+                        "ingest_cached_s": round(ingest_cached_s, 3),
+                        "index_mb": round(index_mb, 3),
+                        "latency_p50_ms": round(
+                            float(np.percentile(latencies_ms, 50)), 3
+                        ),
+                        "latency_p95_ms": round(
+                            float(np.percentile(latencies_ms, 95)), 3
+                        ),
+                    }
+                )
+        return results
+
+    def run(
+        self,
+        chunk_sizes: List[int],
+        chunk_overlaps: List[int],
+        top_ks: List[int],
+        top_k_reranks: List[int],
+    ) -> List[dict]:
+        results = []
+        for chunk_size, chunk_overlap in itertools.product(chunk_sizes, chunk_overlaps):
+            if chunk_overlap >= chunk_size:
+                continue
+            print(f"Chunking with chunk_size={chunk_size} overlap={chunk_overlap}")
+            results += self._eval_chunking(
+                chunk_size, chunk_overlap, top_ks, top_k_reranks
+            )
+            self._cache.save()
+        pareto_front(results)
+        print(
+            pd.DataFrame(results)
+            .sort_values("mrr", ascending=False)
+            .to_string(index=False)
+        )
+        return results
@@ -0,0 +1,371 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "the of and to in is was he for it with as his on be at by had are but "
+    "from or have an they which one you were her all she there would their we "
+    "him been has when who will more no if out so said what up its about into "
+    "than them can only other new some could time these two may then do first"
+).split()
+
+
+@dataclass
+class FakeOllamaConfig:
+    ttft: float = 0.2
+    tokens_per_sec: float = 50.0
+    num_tokens: int = 128
+    failure_rate: float = 0.0
+    max_concurrency: int = 4
+    max_queue: int = 64
+    reply: str = "text"
+    models: list[str] = field(default_factory=lambda: ["llama3.1:latest"])
+    pull_steps: int = 10
+    seed: int = 0
+
+
+class FakeOllamaState:
+    """Concurrency limiter and counters shared by all request threads."""
+
+    def __init__(self, config: FakeOllamaConfig) -> None:
+        self.config = config
+        self._slots = threading.Semaphore(config.max_concurrency)
+        self._lock = threading.Lock()
+        self._rng = random.Random(config.seed)
+        self.stats = {
+            "requests": 0,
+            "active": 0,
+            "waiting": 0,
+            "failed": 0,
+            "rejected": 0,
+            "tokens": 0,
+        }
+
+    def incr(self, key: str, value: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += value
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self._rng.random() < self.config.failure_rate
+
+    def acquire(self) -> bool:
+        # Like Ollama, queue up to max_queue requests and reject the rest;
+        # only requests that find every slot busy count as waiting
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                if self.stats["waiting"] >= self.config.max_queue:
+                    self.stats["rejected"] += 1
+                    return False
+                self.stats["waiting"] += 1
+            self._slots.acquire()
+            with self._lock:
+                self.stats["waiting"] -= 1
+        with self._lock:
+            self.stats["active"] += 1
+        return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.stats["active"] -= 1
+        self._slots.release()
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def make_reply(config: FakeOllamaConfig, prompt: str) -> list[str]:
+    """Tokens of the reply, deterministic for a given prompt."""
+    if config.reply == "json-echo":
+        # Echo one record per JSON input line, as the job system expects
+        records = []
+        for line in prompt.splitlines():
+            line = line.strip()
+            if line.startswith("{"):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(record, dict) and "id" in record:
+                    records.append({"id": record["id"], "fake": True})
+        text = json.dumps(records)
+        return [text[i : i + 4] for i in range(0, len(text), 4)]
+    rng = random.Random(f"{config.seed}:{prompt}")
+    return [rng.choice(WORDS) + " " for _ in range(config.num_tokens)]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeOllamaServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self) -> FakeOllamaState:
+        return self.server.state
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length == 0:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, payload: dict) -> None:
+        data = (json.dumps(payload) + "\n").encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            models = [
+                {
+                    "name": name,
+                    "model": name,
+                    "modified_at": now_iso(),
+                    "size": 0,
+                    "digest": "fake",
+                    "details": {"family": "fake", "parameter_size": "0B"},
+                }
+                for name in self.state.config.models
+            ]
+            self._send_json(200, {"models": models})
+        elif self.path == "/api/stats":
+            self._send_json(200, dict(self.state.stats))
+        elif self.path == "/":
+            body = b"Ollama is running"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        try:
+            request = self._read_json()
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+
+        if self.path == "/api/pull":
+            self._pull(request)
+        elif self.path == "/api/chat":
+            messages = request.get("messages") or []
+            prompt = "\n".join(m.get("content", "") for m in messages)
+            self._generate(request, prompt, chat=True)
+        elif self.path == "/api/generate":
+            self._generate(request, request.get("prompt", ""), chat=False)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _pull(self, request: dict) -> None:
+        name = request.get("name") or request.get("model")
+        if not name:
+            self._send_json(400, {"error": "model name is required"})
+            return
+        config = self.state.config
+        if name not in config.models:
+            config.models.append(name)
+        total = 1_000_000
+        statuses = [{"status": "pulling manifest"}]
+        for step in range(1, config.pull_steps + 1):
+            statuses.append(
+                {
+                    "status": "downloading",
+                    "digest": "fake",
+                    "total": total,
+                    "completed": total * step // config.pull_steps,
+                }
+            )
+        statuses.append({"status": "success"})
+        if request.get("stream", True) is False:
+            self._send_json(200, statuses[-1])
+            return
+        self._start_stream()
+        for status in statuses:
+            self._write_chunk(status)
+            time.sleep(0.01)
+        self._end_stream()
+
+    def _generate(self, request: dict, prompt: str, chat: bool) -> None:
+        state = self.state
+        config = state.config
+        state.incr("requests")
+        model = request.get("model", "")
+        if model not in config.models and f"{model}:latest" not in config.models:
+            self._send_json(404, {"error": f"model '{model}' not found"})
+            return
+        if state.should_fail():
+            state.incr("failed")
+            self._send_json(500, {"error": "injected failure"})
+            return
+        if not state.acquire():
+            self._send_json(503, {"error": "server busy, please try again."})
+            return
+
+        try:
+            start = time.perf_counter()
+            tokens = make_reply(config, prompt)
+            time.sleep(config.ttft)
+            prompt_tokens = len(prompt.split())
+            stream = request.get("stream", True)
+            interval = 1.0 / config.tokens_per_sec if config.tokens_per_sec else 0
+
+            def chunk(content: str, done: bool) -> dict:
+                payload = {"model": model, "created_at": now_iso(), "done": done}
+                if chat:
+                    payload["message"] = {"role": "assistant", "content": content}
+                else:
+                    payload["response"] = content
+                return payload
+
+            def final(content: str) -> dict:
+                elapsed = time.perf_counter() - start
+                payload = chunk(content, True)
+                payload.update(
+                    {
+                        "done_reason": "stop",
+                        "total_duration": int(elapsed * 1e9),
+                        "load_duration": 0,
+                        "prompt_eval_count": prompt_tokens,
+                        "prompt_eval_duration": int(config.ttft * 1e9),
+                        "eval_count": len(tokens),
+                        "eval_duration": int((elapsed - config.ttft) * 1e9),
+                    }
+                )
+                return payload
+
+            if stream:
+                self._start_stream()
+                for token in tokens:
+                    self._write_chunk(chunk(token, False))
+                    time.sleep(interval)
+                self._write_chunk(final(""))
+                self._end_stream()
+            else:
+                time.sleep(interval * len(tokens))
+                self._send_json(200, final("".join(tokens)))
+            state.incr("tokens", len(tokens))
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away mid-stream
+            pass
+        finally:
+            state.release()
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], config: FakeOllamaConfig) -> None:
+        super().__init__(address, FakeOllamaHandler)
+        self.state = FakeOllamaState(config)
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections are expected under load
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+
+def run_fake_ollama_server(
+    host: str = "127.0.0.1",
+    port: int = 11434,
+    config: FakeOllamaConfig | None = None,
+    background: bool = False,
+) -> FakeOllamaServer:
+    """Start the fake server, in a daemon thread if `background` is set."""
+    server = FakeOllamaServer((host, port), config or FakeOllamaConfig())
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    else:
+        print(f"Fake Ollama listening on http://{host}:{port}")
+        server.serve_forever()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Bind host")
+    parser.add_argument("--port", type=int, default=11434, help="Bind port")
+    parser.add_argument(
+        "--ttft", type=float, default=0.2, help="Seconds before the first token"
+    )
+    parser.add_argument(
+        "--tokens-per-sec", type=float, default=50.0, help="Generation speed"
+    )
+    parser.add_argument(
+        "--num-tokens", type=int, default=128, help="Tokens per text reply"
+    )
+    parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of generations answered with HTTP 500",
+    )
+    parser.add_argument(
+        "--max-concurrency", type=int, default=4, help="Parallel generations"
+    )
+    parser.add_argument(
+        "--max-queue",
+        type=int,
+        default=64,
+        help="Waiting requests before answering HTTP 503",
+    )
+    parser.add_argument(
+        "--reply",
+        type=str,
+        default="text",
+        choices=["text", "json-echo"],
+        help="Random text, or a JSON list echoing the ids of JSON input lines",
+    )
+    parser.add_argument(
+        "--models",
+        type=str,
+        nargs="+",
+        default=["llama3.1:latest"],
+        help="Models reported as installed",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    run_fake_ollama_server(
+        host=args.host,
+        port=args.port,
+        config=FakeOllamaConfig(
+            ttft=args.ttft,
+            tokens_per_sec=args.tokens_per_sec,
+            num_tokens=args.num_tokens,
+            failure_rate=args.failure_rate,
+            max_concurrency=args.max_concurrency,
+            max_queue=args.max_queue,
+            reply=args.reply,
+            models=args.models,
+            seed=args.seed,
+        ),
+    )
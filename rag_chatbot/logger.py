@@ -1,12 +1,21 @@
 import os
 import sys
 import re
+import threading
+from collections import deque
+
+# Regex pattern for progress bar lines
+PROGRESS_PATTERN = re.compile(r"\[.*\] \d+\.\d+%")
 
 
 class Logger:
-    def __init__(self, filename):
+    def __init__(self, filename, max_lines: int = 300):
         self.filename = os.path.join(os.getcwd(), filename)
         self.terminal = sys.stdout
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=max_lines)
+        self._partial = b""
+        self._offset = 0
         self.reset_logs()
         self.log = open(self.filename, "w")
         self.flush()
@@ -25,37 +34,68 @@ class Logger:
     def reset_logs(self):
         with open(self.filename, "w") as file:
             file.truncate(0)
+        self._reset_tail()
+
+    def _reset_tail(self):
+        with self._lock:
+            self._recent.clear()
+            self._partial = b""
+            self._offset = 0
+
+    def _is_progress(self, line):
+        return bool(PROGRESS_PATTERN.search(line)) and " - Completed!\n" not in line
+
+    def _append_line(self, line):
+        # Filter out lines containing null characters
+        if "\x00" in line:
+            return
+        # Only the latest unfinished progress bar is kept, and only while it is
+        # the last line, so drop it as soon as any newer line arrives.
+        if self._recent and self._is_progress(self._recent[-1]):
+            self._recent.pop()
+        self._recent.append(line)
 
     def read_logs(self):
         sys.stdout.flush()
 
-        # Read the entire content of the log file
-        with open(self.filename, "r") as f:
-            log_content = f.readlines()
+        with self._lock:
+            try:
+                size = os.path.getsize(self.filename)
+            except OSError:
+                return ""
 
-        # Filter out lines containing null characters
-        log_content = [line for line in log_content if "\x00" not in line]
-
-        # Define the regex pattern for the progress bar
-        progress_pattern = re.compile(r"\[.*\] \d+\.\d+%")
-
-        # Find lines matching the progress bar pattern
-        progress_lines = [
-            line
-            for line in log_content
-            if progress_pattern.search(line) and " - Completed!\n" not in line
-        ]
-
-        # If there are multiple progress bars, keep only the last one in recent_lines
-        if progress_lines:
-            valid_content = [line for line in log_content if line not in progress_lines]
-            if log_content[-1] == progress_lines[-1]:
-                valid_content.append(progress_lines[-1].strip("\n"))
-        else:
-            valid_content = log_content
-
-        # Get the latest 30 lines
-        recent_lines = valid_content[-300:]
+            # The file was truncated behind our back, start over
+            if size < self._offset:
+                self._recent.clear()
+                self._partial = b""
+                self._offset = 0
+
+            # Only read what was appended since the last poll
+            if size > self._offset:
+                with open(self.filename, "rb") as f:
+                    f.seek(self._offset)
+                    chunk = f.read(size - self._offset)
+                self._offset += len(chunk)
+                data = self._partial + chunk
+                # A \r\n may be split across reads: hold a trailing \r back
+                # until the next byte shows whether it ends the line on its own
+                held = b""
+                if data.endswith(b"\r"):
+                    data, held = data[:-1], b"\r"
+                data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+                lines = data.split(b"\n")
+                self._partial = lines.pop() + held
+                for line in lines:
+                    self._append_line(line.decode("utf-8", errors="replace") + "\n")
+
+            recent_lines = list(self._recent)
+            partial = self._partial.rstrip(b"\r").decode("utf-8", errors="replace")
+            if partial and "\x00" not in partial:
+                if recent_lines and self._is_progress(recent_lines[-1]):
+                    recent_lines.pop()
+                recent_lines.append(partial)
+            elif recent_lines and self._is_progress(recent_lines[-1]):
+                recent_lines[-1] = recent_lines[-1].strip("\n")
 
         # Return the joined recent lines
         return "".join(recent_lines)
@@ -1,4 +1,8 @@
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from .core import (
+    LazyEmbedding,
     LocalChatEngine,
     LocalDataIngestion,
     LocalRAGModel,
@@ -6,24 +10,78 @@ from .core import (
     LocalVectorStore,
     get_system_prompt,
 )
+from .core.engine import get_rerank_model
+from .core.model import cancel_on
+from .core.ingestion import IngestionJob, IngestionWorker
+from .profiling import Profiler
+from .setting import RAGSettings
+from .startup import StartupTimer
+from .tracing import TracedStreamingResponse, Tracer
 from llama_index.core import Settings
 from llama_index.core.chat_engine.types import StreamingAgentChatResponse
 from llama_index.core.prompts import ChatMessage, MessageRole
+from llama_index.core.schema import BaseNode
 
 
 class LocalRAGPipeline:
-    def __init__(self, host: str = "host.docker.internal") -> None:
+    def __init__(
+        self,
+        host: str = "host.docker.internal",
+        trace_file: str | None = None,
+        profiler: Profiler | None = None,
+    ) -> None:
         self._host = host
+        self._setting = RAGSettings()
         self._language = "eng"
         self._model_name = ""
         self._system_prompt = get_system_prompt("eng", is_rag_prompt=False)
-        self._engine = LocalChatEngine(host=host)
-        self._default_model = LocalRAGModel.set(self._model_name, host=host)
+        self._engine = LocalChatEngine(setting=self._setting, host=host)
+        # One LLM client for startup, on the default model until a model is
+        # selected, shared by the engines and the global settings
+        self._default_model = LocalRAGModel.set(host=host)
         self._query_engine = None
-        self._ingestion = LocalDataIngestion()
+        self._profiler = profiler or Profiler()
+        self._ingestion = LocalDataIngestion(profiler=self._profiler)
+        self._ingestion_worker = IngestionWorker(
+            store_fn=self.store_nodes, commit_fn=self.set_chat_mode
+        )
+        self._state_lock = threading.Lock()
+        self._tracer = Tracer(trace_file=trace_file)
         self._vector_store = LocalVectorStore(host=host)
-        Settings.llm = LocalRAGModel.set(host=host)
-        Settings.embed_model = LocalEmbedding.set(host=host)
+        # The embedding model is only loaded on first use or by warm_up.
+        Settings.llm = self._default_model
+        Settings.embed_model = LocalEmbedding.set(self._setting, lazy=True)
+
+    def warm_up(self, timer: StartupTimer | None = None) -> threading.Thread:
+        """Load the embedding and rerank models in parallel in the background."""
+        timer = timer or StartupTimer()
+
+        def _load(name, fn, *args):
+            with timer.stage(name):
+                fn(*args)
+
+        def _run():
+            embed_model = Settings.embed_model
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                futures = [
+                    executor.submit(
+                        _load, "rerank_model", get_rerank_model, self._setting
+                    )
+                ]
+                if isinstance(embed_model, LazyEmbedding):
+                    futures.append(
+                        executor.submit(_load, "embed_model", embed_model.load)
+                    )
+                for future in futures:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"Warm-up failed: {e}")
+            print(timer.report())
+
+        thread = threading.Thread(target=_run, name="warm-up", daemon=True)
+        thread.start()
+        return thread
 
     def get_model_name(self):
         return self._model_name
@@ -71,7 +129,9 @@ class LocalRAGPipeline:
         )
 
     def set_embed_model(self, model_name: str):
-        Settings.embed_model = LocalEmbedding.set(model_name, self._host)
+        setting = self._setting.model_copy(deep=True)
+        setting.ingestion.embed_llm = model_name
+        Settings.embed_model = LocalEmbedding.set(setting, lazy=True)
 
     def pull_model(self, model_name: str):
         return LocalRAGModel.pull(self._host, model_name)
@@ -85,21 +145,69 @@ class LocalRAGPipeline:
     def check_exist_embed(self, model_name: str) -> bool:
         return LocalEmbedding.check_model_exist(self._host, model_name)
 
-    def store_nodes(self, input_files: list[str] = None) -> None:
-        self._ingestion.store_nodes(input_files=input_files)
+    def store_nodes(
+        self, input_files: list[str] = None, progress_callback=None
+    ) -> None:
+        self._ingestion.store_nodes(
+            input_files=input_files, progress_callback=progress_callback
+        )
+
+    def store_corpus(
+        self,
+        name: str,
+        nodes: list[BaseNode],
+        embeddings: np.ndarray | None = None,
+        embed_model: str | None = None,
+    ) -> None:
+        # Nodes prepared outside the pipeline, e.g. from a bible.db; with
+        # embeddings, queries must be embedded with the same model
+        if embed_model:
+            self.set_embed_model(embed_model)
+        self._ingestion.add_nodes(name, nodes, embeddings)
+
+    def submit_documents(self, input_files: list[str]) -> IngestionJob:
+        # Embed in the background; chat keeps using the current engine until
+        # the worker swaps in the new one via set_chat_mode.
+        return self._ingestion_worker.submit(input_files)
+
+    def get_ingestion_job(self) -> IngestionJob | None:
+        return self._ingestion_worker.get_latest_job()
+
+    def is_ingesting(self) -> bool:
+        return self._ingestion_worker.is_busy()
 
     def set_chat_mode(self, system_prompt: str | None = None):
-        self.set_language(self._language)
-        self.set_system_prompt(system_prompt)
-        self.set_model()
-        self.set_engine()
+        # Build the new prompt, model and engine first, then swap them in
+        # together so concurrent queries never see a half-updated pipeline.
+        system_prompt = system_prompt or get_system_prompt(
+            language=self._language, is_rag_prompt=self._ingestion.check_nodes_exist()
+        )
+        llm = LocalRAGModel.set(
+            model_name=self._model_name,
+            system_prompt=system_prompt,
+            host=self._host,
+        )
+        query_engine = self._engine.set_engine(
+            llm=llm,
+            nodes=self._ingestion.get_ingested_nodes(),
+            language=self._language,
+            vector_store=self._ingestion.get_vector_store(),
+        )
+        with self._state_lock:
+            self._system_prompt = system_prompt
+            Settings.llm = llm
+            self._default_model = llm
+            self._query_engine = query_engine
 
     def set_engine(self):
-        self._query_engine = self._engine.set_engine(
+        query_engine = self._engine.set_engine(
             llm=self._default_model,
             nodes=self._ingestion.get_ingested_nodes(),
             language=self._language,
+            vector_store=self._ingestion.get_vector_store(),
         )
+        with self._state_lock:
+            self._query_engine = query_engine
 
     def get_history(self, chatbot: list[list[str]]):
         history = []
@@ -110,11 +218,40 @@ class LocalRAGPipeline:
         return history
 
     def query(
-        self, mode: str, message: str, chatbot: list[list[str]]
+        self,
+        mode: str,
+        message: str,
+        chatbot: list[list[str]],
+        isolated: bool = False,
+        cancel_event: threading.Event | None = None,
     ) -> StreamingAgentChatResponse:
-        if mode == "chat":
-            history = self.get_history(chatbot)
-            return self._query_engine.stream_chat(message, history)
-        else:
-            self._query_engine.reset()
-            return self._query_engine.stream_chat(message)
+        # isolated: answer on a fork of the engine, for callers running
+        # several conversations at once. cancel_event: stops the generation
+        # once set, e.g. when the client went away.
+        with self._state_lock:
+            query_engine = self._query_engine
+        if isolated:
+            query_engine = self._engine.fork_engine(query_engine)
+        trace = self._tracer.start(message, mode=mode)
+        with (
+            trace.activate(),
+            self._profiler.profile("query", label=message),
+            cancel_on(cancel_event),
+        ):
+            with trace.span("retrieval"):
+                if mode == "chat":
+                    history = self.get_history(chatbot)
+                    response = query_engine.stream_chat(message, history)
+                else:
+                    query_engine.reset()
+                    response = query_engine.stream_chat(message)
+        return TracedStreamingResponse(response, trace, self._tracer)
+
+    def get_profiling(self) -> list[str]:
+        return self._profiler.get_targets()
+
+    def set_profiling(self, targets: list[str]):
+        self._profiler.set_targets(targets)
+
+    def get_last_trace(self):
+        return self._tracer.last_trace
@@ -0,0 +1,90 @@
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterable
+
+PROFILE_ENV = "RAG_PROFILE"
+PROFILE_TARGETS = ["query", "ingestion"]
+
+
+class Profiler:
+    """
+    Opt-in cProfile capture of single queries and ingestions.
+
+    Targets are enabled with `RAG_PROFILE=query,ingestion` (or `all`) or at
+    runtime with `set_targets`. Each profiled run is dumped to a timestamped
+    .prof file in `output_dir`, and its hottest functions are written to the
+    logger so they show up in the log view.
+    """
+
+    def __init__(
+        self, output_dir: str | None = None, logger: Any = None, top_n: int = 20
+    ) -> None:
+        self._output_dir = output_dir or os.getcwd()
+        self._logger = logger
+        self._top_n = top_n
+        self._lock = threading.Lock()
+        self._targets = self._parse(os.getenv(PROFILE_ENV, "").split(","))
+        self.last_profile: str | None = None
+
+    @staticmethod
+    def _parse(targets: Iterable[str]) -> set[str]:
+        targets = {t.strip().lower() for t in targets if t and t.strip()}
+        if targets & {"1", "true", "all"}:
+            return set(PROFILE_TARGETS)
+        return targets & set(PROFILE_TARGETS)
+
+    def get_targets(self) -> list[str]:
+        with self._lock:
+            return [t for t in PROFILE_TARGETS if t in self._targets]
+
+    def set_targets(self, targets: Iterable[str]) -> None:
+        with self._lock:
+            self._targets = self._parse(targets)
+
+    def is_enabled(self, target: str) -> bool:
+        with self._lock:
+            return target in self._targets
+
+    @contextmanager
+    def profile(self, target: str, label: str = ""):
+        if not self.is_enabled(target):
+            yield None
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profile is already running on this interpreter
+            yield None
+            return
+        try:
+            yield profile
+        finally:
+            profile.disable()
+            self._save(target, label, profile)
+
+    def _save(self, target: str, label: str, profile: cProfile.Profile) -> None:
+        now = time.time()
+        timestamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now))
+        timestamp += f"-{int(now * 1000) % 1000:03d}"
+        path = os.path.join(self._output_dir, f"profile_{target}_{timestamp}.prof")
+        profile.dump_stats(path)
+        self.last_profile = path
+
+        stream = io.StringIO()
+        stats = pstats.Stats(profile, stream=stream)
+        stats.strip_dirs().sort_stats("cumulative").print_stats(self._top_n)
+        header = f"Profile of {target}" + (f" '{label[:60]}'" if label else "")
+        self._write(f"{header} saved to {path}\n{stream.getvalue()}\n")
+
+    def _write(self, text: str) -> None:
+        if self._logger is None:
+            print(text)
+            return
+        self._logger.write(text)
+        self._logger.flush()
@@ -43,6 +43,15 @@ class IngestionSettings(BaseModel):
     )
     paragraph_sep: str = Field(default="\n \n", description="Paragraph separator")
     num_workers: int = Field(default=0, description="Number of workers")
+    embed_dtype: str = Field(
+        default="float32", description="Stored embedding dtype (float32/float16)"
+    )
+    stream_min_pages: int = Field(
+        default=200, description="Stream documents with more pages, 0 to disable"
+    )
+    stream_window_pages: int = Field(
+        default=20, description="Pages read, split and embedded at a time"
+    )
 
 
 class StorageSettings(BaseModel):
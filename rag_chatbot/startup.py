@@ -0,0 +1,54 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """Records how long each startup stage takes, relative to process start."""
+
+    def __init__(self, start: float | None = None) -> None:
+        self._start = start if start is not None else time.perf_counter()
+        self._last = self._start
+        self._stages: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, name: str) -> None:
+        # Sequential stage: time since the previous mark
+        now = time.perf_counter()
+        with self._lock:
+            self._stages[name] = now - self._last
+            self._last = now
+
+    @contextmanager
+    def stage(self, name: str):
+        # Independent stage, may overlap with others (e.g. background warm-up)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._stages[name] = time.perf_counter() - start
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def report(self) -> str:
+        with self._lock:
+            stages = dict(self._stages)
+        lines = ["Startup timing:"]
+        for name, seconds in stages.items():
+            lines.append(f"  {name:<20} {seconds:8.3f}s")
+        lines.append(f"  {'total':<20} {self.elapsed():8.3f}s")
+        return "\n".join(lines)
+
+    def save(self, path: str) -> None:
+        # Append one JSON record per run so cold starts can be compared
+        with self._lock:
+            record = {
+                "timestamp": time.time(),
+                "total": self.elapsed(),
+                "stages": dict(self._stages),
+            }
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
@@ -0,0 +1,33 @@
+import sqlite3
+from llama_index.core.embeddings import MockEmbedding
+from rag_chatbot.core.ingestion import LocalDataIngestion
+from rag_chatbot.corpus import build_chunk_vectors, load_corpus_nodes
+from rag_chatbot.setting import RAGSettings
+from rag_chatbot.corpus.nodes import METADATA_COLUMNS
+
+
+def test_corpus_vectors_are_stored_as_one_block(tmp_path):
+    db_path = str(tmp_path / "bible.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        f"CREATE TABLE text_chunks (id TEXT PRIMARY KEY, content TEXT, "
+        f"{', '.join(METADATA_COLUMNS)})"
+    )
+    conn.executemany(
+        "INSERT INTO text_chunks (id, content) VALUES (?, ?)",
+        [("ch001_sc01_p01", "The keeper."), ("ch001_sc01_p02", "The ships.")],
+    )
+    conn.commit()
+    conn.close()
+    build_chunk_vectors(db_path, RAGSettings(), MockEmbedding(embed_dim=8))
+
+    nodes, embeddings, embed_model = load_corpus_nodes(db_path)
+    assert [node.node_id for node in nodes] == ["ch001_sc01_p01", "ch001_sc01_p02"]
+    assert embeddings.shape == (2, 8)
+    assert embed_model == RAGSettings().ingestion.embed_llm
+    assert all(node.embedding is None for node in nodes)
+
+    ingestion = LocalDataIngestion()
+    ingestion.add_nodes("bible.db", nodes, embeddings)
+    assert ingestion.get_ingested_embeddings().shape == (2, 8)
+    assert len(ingestion.get_vector_store()) == 2
@@ -0,0 +1,38 @@
+import fitz
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.schema import TextNode
+from rag_chatbot.core.ingestion import LocalDataIngestion
+from rag_chatbot.core.ingestion.node_store import NodeStore
+
+
+def make_pdf(path, text=None):
+    document = fitz.open()
+    page = document.new_page()
+    if text:
+        page.insert_text((72, 72), text)
+    document.save(path)
+    return str(path)
+
+
+def test_empty_file_keeps_stored_vectors(tmp_path):
+    files = [
+        make_pdf(tmp_path / "text.pdf", "The lighthouse keeper counted the ships."),
+        make_pdf(tmp_path / "scan.pdf"),
+    ]
+    ingestion = LocalDataIngestion()
+    nodes = ingestion.store_nodes(files, embed_model=MockEmbedding(embed_dim=8))
+
+    vector_store = ingestion.get_vector_store()
+    assert vector_store is not None
+    assert len(vector_store) == len(nodes) > 0
+
+
+def test_file_without_nodes_keeps_stored_vectors():
+    store = NodeStore()
+    store.add("text.pdf", [TextNode(text="The keeper.", embedding=[1.0, 0.0])])
+    store.add("scan.pdf", [])
+
+    blocks = store.get_blocks()
+    assert blocks is not None
+    assert [len(nodes) for nodes, _ in blocks] == [1]
+    assert store.get_embeddings().shape == (1, 2)
@@ -0,0 +1,27 @@
+import numpy as np
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import (
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+    VectorStoreQuery,
+)
+from rag_chatbot.core.vector_store import NumpyVectorStore
+
+
+def test_query_applies_metadata_filters():
+    nodes = [
+        TextNode(id_=f"n{i}", text=f"node {i}", metadata={"chapter": i % 2})
+        for i in range(4)
+    ]
+    store = NumpyVectorStore(blocks=[(nodes, np.eye(4, dtype=np.float32))])
+    filters = MetadataFilters(
+        filters=[MetadataFilter(key="chapter", value=1, operator=FilterOperator.EQ)]
+    )
+
+    result = store.query(
+        VectorStoreQuery(
+            query_embedding=[1.0, 0.0, 0.0, 0.0], similarity_top_k=4, filters=filters
+        )
+    )
+    assert result.ids == ["n1", "n3"] or result.ids == ["n3", "n1"]
@@ -0,0 +1,243 @@
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+from llama_index.core.instrumentation import get_dispatcher
+from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+from llama_index.core.instrumentation.events import BaseEvent
+from llama_index.core.instrumentation.events.llm import (
+    LLMChatEndEvent,
+    LLMCompletionEndEvent,
+)
+
+# Trace of the query being answered, and the innermost open span in it
+_current_trace: ContextVar["QueryTrace | None"] = ContextVar(
+    "current_trace", default=None
+)
+_current_span: ContextVar[dict | None] = ContextVar("current_span", default=None)
+
+# Stages shown in the UI status summary, in pipeline order
+SUMMARY_STAGES = [
+    "condense",
+    "router_select",
+    "query_gen",
+    "bm25",
+    "vector_search",
+    "fusion",
+    "rerank",
+]
+
+
+class QueryTrace:
+    """Spans recorded while answering a single query."""
+
+    def __init__(self, query: str, **attributes: Any) -> None:
+        self.trace_id = uuid.uuid4().hex
+        self.query = query
+        self.attributes = attributes
+        self.spans: list[dict] = []
+        self._start_wall = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _offset_ms(self, t: float) -> float:
+        return (t - self._start) * 1000
+
+    @contextmanager
+    def activate(self):
+        token = _current_trace.set(self)
+        try:
+            yield self
+        finally:
+            _current_trace.reset(token)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any):
+        parent = _current_span.get()
+        span = {
+            "name": name,
+            "parent": parent["name"] if parent else None,
+            "attributes": dict(attributes),
+        }
+        token = _current_span.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            end = time.perf_counter()
+            _current_span.reset(token)
+            span["start_ms"] = round(self._offset_ms(start), 3)
+            span["duration_ms"] = round((end - start) * 1000, 3)
+            with self._lock:
+                self.spans.append(span)
+
+    def add_span(self, name: str, start: float, end: float, **attributes: Any):
+        with self._lock:
+            self.spans.append(
+                {
+                    "name": name,
+                    "parent": None,
+                    "attributes": dict(attributes),
+                    "start_ms": round(self._offset_ms(start), 3),
+                    "duration_ms": round((end - start) * 1000, 3),
+                }
+            )
+
+    def stage_totals(self) -> dict[str, float]:
+        totals: dict[str, float] = {}
+        with self._lock:
+            for span in self.spans:
+                totals[span["name"]] = (
+                    totals.get(span["name"], 0.0) + span["duration_ms"]
+                )
+        return totals
+
+    def summary(self) -> str:
+        totals = self.stage_totals()
+        parts = [
+            f"{name} {totals[name]:.0f}ms" for name in SUMMARY_STAGES if name in totals
+        ]
+        generation = next(
+            (span for span in self.spans if span["name"] == "generation"), None
+        )
+        if generation is not None:
+            attributes = generation["attributes"]
+            if attributes.get("ttft_ms") is not None:
+                parts.append(f"TTFT {attributes['ttft_ms']:.0f}ms")
+            if attributes.get("tokens_per_sec"):
+                parts.append(f"{attributes['tokens_per_sec']:.1f} tok/s")
+        return " | ".join(parts)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "trace_id": self.trace_id,
+            "timestamp": self._start_wall,
+            "query": self.query,
+            "attributes": self.attributes,
+            "total_ms": round(self._offset_ms(time.perf_counter()), 3),
+            "spans": sorted(spans, key=lambda span: span["start_ms"]),
+        }
+
+
+@contextmanager
+def trace_span(name: str, **attributes: Any):
+    """Record a span in the active query trace, no-op outside of a trace."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    with trace.span(name, **attributes) as span:
+        yield span
+
+
+def _add_token_counts(span: dict, raw: Any) -> None:
+    # Ollama reports prompt/completion token counts in the raw response
+    if not isinstance(raw, dict):
+        return
+    attributes = span["attributes"]
+    for key, name in [
+        ("prompt_eval_count", "prompt_tokens"),
+        ("eval_count", "completion_tokens"),
+    ]:
+        if raw.get(key) is not None:
+            attributes[name] = attributes.get(name, 0) + raw[key]
+
+
+class TokenCountEventHandler(BaseEventHandler):
+    """Adds LLM token counts to the innermost span of the active trace."""
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "TokenCountEventHandler"
+
+    def handle(self, event: BaseEvent, **kwargs: Any) -> None:
+        if not isinstance(event, (LLMChatEndEvent, LLMCompletionEndEvent)):
+            return
+        span = _current_span.get()
+        if span is None or event.response is None:
+            return
+        span["attributes"]["llm_calls"] = span["attributes"].get("llm_calls", 0) + 1
+        _add_token_counts(span, event.response.raw)
+
+
+class TracedStreamingResponse:
+    """
+    Wraps a streaming chat response to time the LLM generation.
+
+    Time-to-first-token is measured from the start of the trace, and the
+    finished trace is handed to the tracer once the stream is exhausted.
+    """
+
+    def __init__(self, response: Any, trace: QueryTrace, tracer: "Tracer") -> None:
+        self._response = response
+        self.trace = trace
+        self._tracer = tracer
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._response, name)
+
+    @property
+    def response_gen(self) -> Iterator[str]:
+        start = time.perf_counter()
+        first_token = None
+        num_tokens = 0
+        try:
+            for token in self._response.response_gen:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                num_tokens += 1
+                yield token
+        finally:
+            end = time.perf_counter()
+            decode_time = end - first_token if first_token is not None else 0.0
+            self.trace.add_span(
+                "generation",
+                start,
+                end,
+                ttft_ms=(
+                    round(self.trace._offset_ms(first_token), 3)
+                    if first_token is not None
+                    else None
+                ),
+                completion_tokens=num_tokens,
+                tokens_per_sec=(
+                    round(num_tokens / decode_time, 2) if decode_time > 0 else None
+                ),
+            )
+            self._tracer.finish(self.trace)
+
+
+class Tracer:
+    """Creates query traces and appends finished ones to a JSONL file."""
+
+    _instrumented = False
+
+    def __init__(self, trace_file: str | None = None) -> None:
+        self._trace_file = trace_file
+        self._lock = threading.Lock()
+        self.last_trace: QueryTrace | None = None
+        Tracer._instrument()
+
+    @classmethod
+    def _instrument(cls) -> None:
+        if not cls._instrumented:
+            get_dispatcher().add_event_handler(TokenCountEventHandler())
+            cls._instrumented = True
+
+    def start(self, query: str, **attributes: Any) -> QueryTrace:
+        return QueryTrace(query, **attributes)
+
+    def finish(self, trace: QueryTrace) -> None:
+        self.last_trace = trace
+        if self._trace_file is None:
+            return
+        line = json.dumps(trace.to_dict())
+        with self._lock:
+            with open(self._trace_file, "a") as f:
+                f.write(line + "\n")
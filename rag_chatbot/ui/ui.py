@@ -29,22 +29,24 @@ class DefaultElement:
     MODEL_NOT_EXIST_STATUS: str = "Model doesn't exist!"
     PROCESS_DOCUMENT_SUCCESS_STATUS: str = "Processing documents 📄 completed!"
     PROCESS_DOCUMENT_EMPTY_STATUS: str = "Empty documents!"
+    PROCESS_DOCUMENT_RUNNING_STATUS: str = "Processing documents 📄 in background..."
+    PROCESS_DOCUMENT_FAIL_STATUS: str = "Processing documents 📄 failed!"
     ANSWERING_STATUS: str = "Answering!"
     COMPLETED_STATUS: str = "Completed!"
 
 
 class LLMResponse:
-    def __init__(self) -> None:
-        pass
+    def __init__(self, max_fps: float | None = 20) -> None:
+        # Maximum number of chatbot updates per second while streaming.
+        # None disables throttling and emits one update per token.
+        self._min_interval = 1.0 / max_fps if max_fps else 0.0
 
     def _yield_string(self, message: str):
-        for i in range(len(message)):
-            time.sleep(0.01)
-            yield (
-                DefaultElement.DEFAULT_MESSAGE,
-                [[None, message[: i + 1]]],
-                DefaultElement.DEFAULT_STATUS,
-            )
+        yield (
+            DefaultElement.DEFAULT_MESSAGE,
+            [[None, message]],
+            DefaultElement.DEFAULT_STATUS,
+        )
 
     def welcome(self):
         yield from self._yield_string(DefaultElement.HELLO_MESSAGE)
@@ -61,18 +63,31 @@ class LLMResponse:
         history: list[list[str]],
         response: StreamingAgentChatResponse,
     ):
-        answer = []
+        # Build the transcript once and only update the last answer in place,
+        # coalescing tokens so the UI is refreshed at most `max_fps` times/s.
+        chat = history + [[message, ""]]
+        answer = ""
+        last_update = 0.0
         for text in response.response_gen:
-            answer.append(text)
-            yield (
-                DefaultElement.DEFAULT_MESSAGE,
-                history + [[message, "".join(answer)]],
-                DefaultElement.ANSWERING_STATUS,
-            )
+            answer += text
+            now = time.monotonic()
+            if now - last_update >= self._min_interval:
+                chat[-1][1] = answer
+                last_update = now
+                yield (
+                    DefaultElement.DEFAULT_MESSAGE,
+                    chat,
+                    DefaultElement.ANSWERING_STATUS,
+                )
+        chat[-1][1] = answer
+        status = DefaultElement.COMPLETED_STATUS
+        trace = getattr(response, "trace", None)
+        if trace is not None and trace.summary():
+            status = f"{status} {trace.summary()}"
         yield (
             DefaultElement.DEFAULT_MESSAGE,
-            history + [[message, "".join(answer)]],
-            DefaultElement.COMPLETED_STATUS,
+            chat,
+            status,
         )
 
 
@@ -84,6 +99,7 @@ class LocalChatbotUI:
         host: str = "host.docker.internal",
         data_dir: str = "data/data",
         avatar_images: list[str] = ["./assets/user.png", "./assets/bot.png"],
+        stream_fps: float | None = 20,
     ):
         self._pipeline = pipeline
         self._logger = logger
@@ -95,7 +111,8 @@ class LocalChatbotUI:
             os.path.join(os.getcwd(), image) for image in avatar_images
         ]
         self._variant = "panel"
-        self._llm_response = LLMResponse()
+        self._llm_response = LLMResponse(max_fps=stream_fps)
+        self._reported_job_id = None
 
     def _get_respone(
         self,
@@ -200,9 +217,7 @@ class LocalChatbotUI:
         visible = False if document in [None, []] else True
         return (gr.update(visible=visible), gr.update(visible=visible))
 
-    def _processing_document(
-        self, document: list[str], progress=gr.Progress(track_tqdm=True)
-    ):
+    def _processing_document(self, document: list[str]):
         document = document or []
         if self._host == "host.docker.internal":
             input_files = []
@@ -210,12 +225,33 @@ class LocalChatbotUI:
                 dest = os.path.join(self._data_dir, file_path.split("/")[-1])
                 shutil.move(src=file_path, dst=dest)
                 input_files.append(dest)
-            self._pipeline.store_nodes(input_files=input_files)
         else:
-            self._pipeline.store_nodes(input_files=document)
-        self._pipeline.set_chat_mode()
+            input_files = document
+        self._pipeline.submit_documents(input_files)
+        return DefaultElement.PROCESS_DOCUMENT_RUNNING_STATUS
+
+    def _get_ingestion_status(self):
+        job = self._pipeline.get_ingestion_job()
+        if job is None:
+            return (gr.update(), gr.update(), gr.update())
+        if not job.done or job.id == self._reported_job_id:
+            return (job.describe(), gr.update(), gr.update())
+
+        # Report each finished job once, and only then refresh the prompt
+        self._reported_job_id = job.id
+        if job.status == "failed":
+            gr.Warning(f"Processing failed: {job.error}")
+            return (
+                job.describe(),
+                gr.update(),
+                DefaultElement.PROCESS_DOCUMENT_FAIL_STATUS,
+            )
         gr.Info("Processing Completed!")
-        return (self._pipeline.get_system_prompt(), DefaultElement.COMPLETED_STATUS)
+        return (
+            job.describe(),
+            self._pipeline.get_system_prompt(),
+            DefaultElement.PROCESS_DOCUMENT_SUCCESS_STATUS,
+        )
 
     def _change_system_prompt(self, sys_prompt: str):
         self._pipeline.set_system_prompt(sys_prompt)
@@ -309,6 +345,12 @@ class LocalChatbotUI:
                                 height=150,
                                 interactive=True,
                             )
+                            ingestion_status = gr.Textbox(
+                                label="Ingestion",
+                                value="",
+                                interactive=False,
+                                lines=2,
+                            )
                             with gr.Row():
                                 upload_doc_btn = gr.UploadButton(
                                     label="Upload",
@@ -374,6 +416,13 @@ class LocalChatbotUI:
                         sys_prompt_btn = gr.Button(value="Set System Prompt")
 
             with gr.Tab("Output"):
+                with gr.Row(variant=self._variant):
+                    profiling = gr.CheckboxGroup(
+                        choices=["query", "ingestion"],
+                        value=self._pipeline.get_profiling(),
+                        label="Profile (writes a .prof file per run)",
+                        interactive=True,
+                    )
                 with gr.Row(variant=self._variant):
                     log = gr.Code(
                         label="", language="markdown", interactive=False, lines=30
@@ -411,6 +460,7 @@ class LocalChatbotUI:
                 outputs=[message, chatbot, status],
             )
             language.change(self._change_language, inputs=[language])
+            profiling.change(self._pipeline.set_profiling, inputs=[profiling])
             model.change(
                 self._get_confirm_pull_model,
                 inputs=[model],
@@ -419,7 +469,7 @@ class LocalChatbotUI:
             documents.change(
                 self._processing_document,
                 inputs=[documents],
-                outputs=[system_prompt, status],
+                outputs=[status],
             ).then(
                 self._show_document_btn,
                 inputs=[documents],
@@ -440,6 +490,12 @@ class LocalChatbotUI:
             reset_doc_btn.click(
                 self._reset_document, outputs=[documents, upload_doc_btn, reset_doc_btn]
             )
+            demo.load(
+                self._get_ingestion_status,
+                outputs=[ingestion_status, system_prompt, status],
+                every=1,
+                show_progress="hidden",
+            )
             demo.load(self._welcome, outputs=[message, chatbot, status])
 
         return demo
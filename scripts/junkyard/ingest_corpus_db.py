@@ -1,13 +1,69 @@
 import sqlite3
 import json
-import os
+import hashlib
+import argparse
 
 DB_PATH = "data/bible.db"
 CORPUS_FILE = "data/corpus.jsonl"
 
-def init_db(conn):
+CHUNK_COLUMNS = [
+    "id", "content", "source_file", "chapter_title", "scene_index",
+    "paragraph_index", "location_name", "primary_characters", "tags",
+]
+
+# Columns indexed by text_chunks_fts
+FTS_COLUMNS = ["content", "location_name", "primary_characters", "tags"]
+
+def fts_sql(tokenizer=None, prefix=None):
+    """
+    CREATE statement of the FTS table.
+
+    `tokenizer` is an FTS5 tokenizer spec, e.g. 'trigram' for substring
+    matches; `prefix` lists prefix lengths to index (e.g. [2, 3]) so prefix
+    queries like `Ali*` are answered from the index.
+    """
+    options = FTS_COLUMNS + ["content=text_chunks", "content_rowid=rowid"]
+    if tokenizer:
+        options.append(f"tokenize='{tokenizer}'")
+    if prefix:
+        options.append(f"prefix='{' '.join(str(p) for p in prefix)}'")
+    return "CREATE VIRTUAL TABLE text_chunks_fts USING fts5(" + ", ".join(options) + ")"
+
+# Keep the external content FTS table in sync row by row, so an ingestion
+# only re-indexes the chunks it actually changed
+FTS_TRIGGERS = {
+    "text_chunks_ai": f'''
+        CREATE TRIGGER text_chunks_ai AFTER INSERT ON text_chunks BEGIN
+            INSERT INTO text_chunks_fts(rowid, {", ".join(FTS_COLUMNS)})
+            VALUES (new.rowid, {", ".join("new." + c for c in FTS_COLUMNS)});
+        END
+    ''',
+    "text_chunks_ad": f'''
+        CREATE TRIGGER text_chunks_ad AFTER DELETE ON text_chunks BEGIN
+            INSERT INTO text_chunks_fts(text_chunks_fts, rowid, {", ".join(FTS_COLUMNS)})
+            VALUES ('delete', old.rowid, {", ".join("old." + c for c in FTS_COLUMNS)});
+        END
+    ''',
+    "text_chunks_au": f'''
+        CREATE TRIGGER text_chunks_au AFTER UPDATE OF {", ".join(FTS_COLUMNS)} ON text_chunks BEGIN
+            INSERT INTO text_chunks_fts(text_chunks_fts, rowid, {", ".join(FTS_COLUMNS)})
+            VALUES ('delete', old.rowid, {", ".join("old." + c for c in FTS_COLUMNS)});
+            INSERT INTO text_chunks_fts(rowid, {", ".join(FTS_COLUMNS)})
+            VALUES (new.rowid, {", ".join("new." + c for c in FTS_COLUMNS)});
+        END
+    ''',
+}
+
+def init_db(conn, tokenizer=None, prefix=None):
+    """
+    Create or upgrade the corpus tables.
+
+    Returns True when the FTS index has to be rebuilt from scratch: the FTS
+    table was (re)created with a new configuration or its sync triggers are
+    new, so it can't be trusted to match text_chunks yet.
+    """
     c = conn.cursor()
-    
+
     # Text Chunks Table
     # This stores the lowest level granular text (paragraphs)
     c.execute('''
@@ -18,59 +74,75 @@ def init_db(conn):
             chapter_title TEXT,
             scene_index INTEGER,
             paragraph_index INTEGER,
-            
+
             -- Denormalized meta for fast grep
             location_name TEXT,
             primary_characters TEXT,
-            tags TEXT
+            tags TEXT,
+
+            -- Hash of the other columns, to skip unchanged chunks
+            content_hash TEXT
         )
     ''')
-    
+    columns = [row[1] for row in c.execute("PRAGMA table_info(text_chunks)")]
+    if "content_hash" not in columns:
+        c.execute("ALTER TABLE text_chunks ADD COLUMN content_hash TEXT")
+
     # Full Text Search Virtual Table
-    c.execute('''
-        CREATE VIRTUAL TABLE IF NOT EXISTS text_chunks_fts USING fts5(
-            content,
-            location_name,
-            primary_characters,
-            tags,
-            content=text_chunks,
-            content_rowid=rowid
-        )
-    ''')
-    
+    # Recreated when the tokenizer or prefix configuration changes
+    rebuild = False
+    create_fts = fts_sql(tokenizer, prefix)
+    row = c.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'text_chunks_fts'"
+    ).fetchone()
+    if row is None or row[0] != create_fts:
+        c.execute("DROP TABLE IF EXISTS text_chunks_fts")
+        c.execute(create_fts)
+        rebuild = True
+
+    triggers = {row[0] for row in c.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    for name, sql in FTS_TRIGGERS.items():
+        if name not in triggers:
+            c.execute(sql)
+            rebuild = True
+
     conn.commit()
+    return rebuild
+
+def chunk_hash(row):
+    return hashlib.sha1(json.dumps(row, ensure_ascii=False).encode("utf-8")).hexdigest()
 
-def ingest_corpus():
+def ingest_corpus(tokenizer=None, prefix=None):
     conn = sqlite3.connect(DB_PATH)
-    init_db(conn)
-    
+    rebuild = init_db(conn, tokenizer, prefix)
+
     with open(CORPUS_FILE, 'r') as f:
         rows = []
         for line in f:
             if not line.strip(): continue
             doc = json.loads(line)
-            
+
             # Extract basic IDs
             # id format: ch006_sc01_p01
             # We can parse indices from the ID or metadata
             meta = doc.get("metadata", {})
-            
+
             loc_name = meta.get("location", {}).get("name", "") if isinstance(meta.get("location"), dict) else str(meta.get("location", ""))
-            
+
             chars = ", ".join(meta.get("characters", []))
             tags = ", ".join(meta.get("tags", []))
-            
+
             # Robust integer parsing
             s_idx = meta.get("scene_index", 0)
-            
+
             # P_index from ID
             p_idx = 0
             try:
                 p_idx = int(doc["id"].split("_p")[1])
             except:
                 pass
-                
-            rows.append((
+
+            row = (
                 doc["id"],
                 doc["text"],
                 meta.get("source", ""),
@@ -80,24 +152,50 @@ def ingest_corpus():
                 loc_name,
                 chars,
                 tags
-            ))
-            
-    print(f"Inserting {len(rows)} rows into SQLite...")
-    
+            )
+            rows.append(row + (chunk_hash(row),))
+
+    print(f"Upserting {len(rows)} rows into SQLite...")
+
+    # Upsert instead of INSERT OR REPLACE: rows keep their rowid (the FTS and
+    # vector index key), unchanged rows aren't written at all, and changed
+    # ones go through the update trigger
     c = conn.cursor()
-    c.executemany('''
-        INSERT OR REPLACE INTO text_chunks 
-        (id, content, source_file, chapter_title, scene_index, paragraph_index, location_name, primary_characters, tags)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    c.executemany(f'''
+        INSERT INTO text_chunks ({", ".join(CHUNK_COLUMNS)}, content_hash)
+        VALUES ({", ".join("?" * (len(CHUNK_COLUMNS) + 1))})
+        ON CONFLICT(id) DO UPDATE SET
+            {", ".join(f"{col} = excluded.{col}" for col in CHUNK_COLUMNS[1:])},
+            content_hash = excluded.content_hash
+        WHERE text_chunks.content_hash IS NOT excluded.content_hash
     ''', rows)
-    
-    # Rebuild FTS index
-    print("Rebuilding Search Index...")
-    c.execute("INSERT INTO text_chunks_fts(text_chunks_fts) VALUES('rebuild')")
-    
+    print(f"{c.rowcount} new or changed rows.")
+
+    if rebuild:
+        # New or reconfigured FTS table: index everything once
+        print("Rebuilding Search Index...")
+        c.execute("INSERT INTO text_chunks_fts(text_chunks_fts) VALUES('rebuild')")
+
     conn.commit()
     conn.close()
     print("Done.")
 
 if __name__ == "__main__":
-    ingest_corpus()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--tokenizer",
+        default=None,
+        help=(
+            "FTS5 tokenizer, e.g. 'trigram' or 'porter unicode61' (default "
+            "unicode61); trigram never matches terms shorter than 3 characters"
+        ),
+    )
+    parser.add_argument(
+        "--prefix",
+        type=int,
+        nargs="+",
+        default=None,
+        help="Prefix lengths to index for fast prefix queries, e.g. 2 3",
+    )
+    args = parser.parse_args()
+    ingest_corpus(args.tokenizer, args.prefix)